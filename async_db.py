@@ -0,0 +1,124 @@
+import asyncio
+import functools
+import inspect
+import threading
+
+from database import Database
+from task_runner import executor
+
+# The models and Database are synchronous, so calls run on the TaskRunner
+# executor: async calls and TaskRunner tasks share its task_runner.MAX_WORKERS
+# threads, and together never hold more pooled connections than that
+_loop_thread = None
+_lock = threading.Lock()
+
+
+async def run_sync(fn, *args, **kwargs):
+    """Await fn(*args, **kwargs) run on the shared TaskRunner executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor(), functools.partial(fn, *args, **kwargs))
+
+
+async def iterate_sync(fn, *args, **kwargs):
+    """Async-iterate a synchronous generator such as BaseModel.iter_pages; each step runs on the executor"""
+    iterator = await run_sync(fn, *args, **kwargs)
+    done = object()
+    try:
+        while True:
+            item = await run_sync(next, iterator, done)
+            if item is done:
+                return
+            yield item
+    finally:
+        await run_sync(iterator.close)
+
+
+class AsyncProxy:
+    """Awaitable mirror of a class of synchronous classmethods, e.g. Database or a model.
+
+    AsyncProxy(Medicine).get_page(cursor) returns a coroutine with the result of
+    Medicine.get_page(cursor); generator methods (iter_pages, iter_rows,
+    iter_chunks) become async generators. Everything else, such as table
+    names, is passed through. Calls share the model caches and connection
+    pool with the synchronous code.
+    """
+
+    def __init__(self, target):
+        self.target = target
+
+    def __getattr__(self, name):
+        attr = getattr(self.target, name)
+        if not callable(attr) or isinstance(attr, type):
+            return attr
+        if inspect.isgeneratorfunction(attr):
+            wrapper = functools.partial(iterate_sync, attr)
+        else:
+            wrapper = functools.partial(run_sync, attr)
+        return functools.wraps(attr)(wrapper)
+
+    def __repr__(self):
+        return f"AsyncProxy({self.target.__name__})"
+
+
+AsyncDatabase = AsyncProxy(Database)
+
+
+class AsyncLoopThread:
+    """An asyncio event loop running on a daemon thread, next to the Tk mainloop"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name="asyncio", daemon=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def submit(self, coro):
+        """Schedule a coroutine on the loop; returns a concurrent.futures.Future (cancel() cancels the coroutine)"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+def loop_thread() -> AsyncLoopThread:
+    """The shared loop thread, started on first use"""
+    global _loop_thread
+    with _lock:
+        if _loop_thread is None:
+            _loop_thread = AsyncLoopThread().start()
+        return _loop_thread
+
+
+def run_async(widget, coro, on_done=None, on_error=None, poll_ms: int = 20):
+    """Run a coroutine on the shared loop thread and hand its outcome to the Tk thread.
+
+    on_done(result) or on_error(error) is called from a widget.after() poll,
+    like TaskRunner callbacks; nothing is called if the returned future is
+    cancelled. Must be called on the Tk thread.
+    """
+    future = loop_thread().submit(coro)
+
+    def poll():
+        if not future.done():
+            widget.after(poll_ms, poll)
+            return
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            if on_done is not None:
+                on_done(future.result())
+        elif on_error is not None:
+            on_error(error)
+        else:
+            widget._root().report_callback_exception(type(error), error, error.__traceback__)
+
+    widget.after(poll_ms, poll)
+    return future
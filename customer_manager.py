@@ -1,16 +1,20 @@
 import ttkbootstrap as ttkb
 from ttkbootstrap.constants import *
 from tkinter import messagebox, filedialog
-from database import Customer, Order, Prescription
+from database import Customer
 from dialog import CommonDialog
+from paged_tree import PagedTreeLoader
+from virtual_tree import VirtualTree
+from table_sorter import PageSorter
+from search_controller import SearchController
+from task_runner import TaskRunner
 
 class CustomerManager:
+    LIST_COLUMNS = ["customer_id", "name", "phone", "email", "address", "age", "loyalty_points"]
+
     def __init__(self, parent):
         self.frame = ttkb.Frame(parent, padding=10, bootstyle="light")
         self.current_customer = None
-        self.selected_row = None
-        self.sort_points_reverse = False  
-        self.sort_by_age_reverse = False
         self.setup_ui()
         
 
@@ -22,7 +26,6 @@ class CustomerManager:
         ttkb.Label(search_frame, text="🔍 Search:", font=("Helvetica", 13, "bold")).pack(side=LEFT)
         self.search_entry = ttkb.Entry(search_frame, width=30, font=("Helvetica", 11))
         self.search_entry.pack(side=LEFT, padx=5)
-        self.search_entry.bind("<KeyRelease>", self.search_customers)
 
         # ===== Treeview =====
         self.tree = ttkb.Treeview(
@@ -37,8 +40,6 @@ class CustomerManager:
         self.tree.tag_configure("highlighted", background="#0078D7", foreground="white")
         
         self.tree.pack(fill=BOTH, expand=True, padx=10, pady=5)
-        self.tree.heading("Age", text="Age", command=self.sort_by_age)
-        self.tree.heading("Points", text="Loyalty Points", command=self.sort_by_loyalty_points)
         columns = [
             ("ID", 50),
             ("Name", 150),
@@ -51,9 +52,20 @@ class CustomerManager:
 
         for col, width in columns:
             self.tree.heading(col, text=col)
-            self.tree.heading(col, text=col, command=lambda c=col: self.sort_by_column(c))
 
-        self.tree.bind("<<TreeviewSelect>>", self.on_customer_select)
+        self.view = VirtualTree(self.tree, self.customer_values, self.customer_tags,
+                                on_select=self.on_customer_select, key=lambda cust: cust['customer_id'])
+        self.sorter = PageSorter(self.tree, {
+            "ID": "customer_id", "Name": "name", "Phone": "phone", "Email": "email",
+            "Address": "address", "Age": "age", "Points": "loyalty_points",
+        }, on_sort=self.reload_sorted)
+        self.search_term = None
+        self.filters = {"search_term": None, "where": None}
+        self.runner = TaskRunner(self.frame)
+        self.loader = PagedTreeLoader(self.view, self.fetch_page, on_error=self.show_load_error, runner=self.runner)
+        self.search = SearchController(self.frame, self.fetch_first_page, self.loader.show_first_page,
+                                       on_error=self.show_load_error, runner=self.runner)
+        self.search.attach(self.search_entry, self.begin_search)
         
         ttkb.Label(search_frame, text="Min Points:").pack(side=LEFT, padx=(15, 5))
         self.points_filter = ttkb.Combobox(search_frame, width=10, state="readonly")
@@ -76,48 +88,71 @@ class CustomerManager:
         ttkb.Button(btn_frame, text="📊 Stats", command=self.show_statistics, bootstyle="info-outline", width=12).pack(side=LEFT, padx=5)
         ttkb.Button(btn_frame, text="💳 Points", command=self.show_loyalty_points, bootstyle="info-outline", width=12).pack(side=LEFT, padx=5)
         ttkb.Button(btn_frame, text="👵 Age Dist.", command=self.show_age_distribution, bootstyle="info-outline", width=12).pack(side=LEFT, padx=5)
-        ttkb.Button(btn_frame, text="⬇️ Sort by Points", command=self.sort_by_loyalty_points,
+        ttkb.Button(btn_frame, text="⬇️ Sort by Points", command=lambda: self.sorter.sort("Points"),
             bootstyle="info-outline", width=16, padding=(10,6)).pack(side=LEFT, padx=5)
 
         self.load_customers()
 
     def load_customers(self, search_term=None):
-        self.tree.delete(*self.tree.get_children())
-        try:
-            customers = Customer.get_all(search_term)
-            
-            # فلتر حسب نقاط الولاء
-            selected_filter = self.points_filter.get()
-            if selected_filter != "All":
-                min_points = int(selected_filter.replace(">=", "").strip())
-                customers = [c for c in customers if c['loyalty_points'] and int(c['loyalty_points']) >= min_points]
-
-            for cust in customers:
-                points = cust['loyalty_points'] or 0
-                tag = "vip" if points >= 1000 else "regular"
-
-                self.tree.insert("", ttkb.END, values=(
-                    cust['customer_id'],
-                    cust['name'],
-                    cust['phone'] or "N/A",
-                    cust['email'] or "N/A",
-                    cust['address'] or "N/A",
-                    cust['age'] or "N/A",
-                    points
-                ), tags=(tag,))
-
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load customers: {str(e)}")
-
-
-
-    def search_customers(self, event=None):
-        self.load_customers(self.search_entry.get())
-
-    def on_customer_select(self, event):
-        selected = self.tree.selection()
-        if selected:
-            self.current_customer = self.tree.item(selected[0])['values']
+        """Show the first page of matching customers; later pages load while scrolling."""
+        self.search.cancel()
+        self.search_term = search_term or None
+        self.filters = self.page_filter()
+        self.loader.reset()
+
+    def page_filter(self):
+        """Current search box and points filter as get_page arguments."""
+        where = None
+        selected_filter = self.points_filter.get()
+        if selected_filter and selected_filter != "All":
+            min_points = int(selected_filter.replace(">=", "").strip())
+            where = ("loyalty_points >= %s", (min_points,))
+        return {"search_term": self.search_term, "where": where, **self.sorter.page_args()}
+
+    def reload_sorted(self):
+        """Show the first page in the new heading order."""
+        self.search.cancel()
+        self.filters = self.page_filter()
+        self.loader.restart()
+
+    def fetch_page(self, cursor):
+        return Customer.get_page(cursor, columns=self.LIST_COLUMNS, **self.filters)
+
+    def begin_search(self):
+        """Arguments for a background search on the current search box text."""
+        self.search_term = self.search_entry.get() or None
+        self.filters = self.page_filter()
+        return (self.filters,)
+
+    def fetch_first_page(self, filters):
+        return Customer.get_page(None, columns=self.LIST_COLUMNS, **filters)
+
+    def customer_values(self, cust):
+        return (
+            cust['customer_id'],
+            cust['name'],
+            cust['phone'] or "N/A",
+            cust['email'] or "N/A",
+            cust['address'] or "N/A",
+            cust['age'] or "N/A",
+            cust['loyalty_points'] or 0
+        )
+
+    def customer_tags(self, cust):
+        return ("vip",) if (cust['loyalty_points'] or 0) >= 1000 else ("regular",)
+
+    def show_load_error(self, error):
+        messagebox.showerror("Error", f"Failed to load customers: {str(error)}")
+
+
+
+    def after_save(self, message):
+        self.load_customers()
+        messagebox.showinfo("Success", message)
+
+    def on_customer_select(self, cust):
+        if cust:
+            self.current_customer = self.view.values(cust)
             self.edit_btn.config(state=NORMAL)
             self.delete_btn.config(state=NORMAL)
         else:
@@ -139,9 +174,9 @@ class CustomerManager:
             try:
                 dialog.result['age'] = int(dialog.result['age']) if dialog.result['age'] else None
                 dialog.result['loyalty_points'] = int(dialog.result['loyalty_points']) if dialog.result['loyalty_points'] else 0
-                Customer.create(dialog.result)
-                self.load_customers()
-                messagebox.showinfo("Success", "Customer added successfully")
+                self.runner.submit(Customer.create, dialog.result,
+                                   on_done=lambda _: self.after_save("Customer added successfully"),
+                                   on_error=lambda e: messagebox.showerror("Error", f"Failed to add customer: {str(e)}"))
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to add customer: {str(e)}")
 
@@ -173,9 +208,9 @@ class CustomerManager:
             try:
                 dialog.result['age'] = int(dialog.result['age']) if dialog.result['age'] else None
                 dialog.result['loyalty_points'] = int(dialog.result['loyalty_points']) if dialog.result['loyalty_points'] else 0
-                Customer.update(customer_id, dialog.result)
-                self.load_customers()
-                messagebox.showinfo("Success", "Customer updated successfully")
+                self.runner.submit(Customer.update, customer_id, dialog.result,
+                                   on_done=lambda _: self.after_save("Customer updated successfully"),
+                                   on_error=lambda e: messagebox.showerror("Error", f"Failed to update customer: {str(e)}"))
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to update customer: {str(e)}")
 
@@ -184,15 +219,9 @@ class CustomerManager:
             return
 
         if messagebox.askyesno("Confirm", "Delete this customer and all related data?", icon="warning"):
-            try:
-                customer_id = self.current_customer[0]
-                Order.delete_by_customer_id(customer_id)
-                Prescription.delete_by_customer_id(customer_id)
-                Customer.delete(customer_id)
-                self.load_customers()
-                messagebox.showinfo("Success", "Customer deleted successfully")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to delete customer: {str(e)}")
+            self.runner.submit(Customer.delete, self.current_customer[0],
+                               on_done=lambda _: self.after_save("Customer deleted successfully"),
+                               on_error=lambda e: messagebox.showerror("Error", f"Failed to delete customer: {str(e)}"))
 
     def export_to_csv(self):
         """Export customer data to CSV."""
@@ -205,26 +234,21 @@ class CustomerManager:
         if not file_path:
             return
 
-        try:
-            import csv
-            with open(file_path, "w", newline='', encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(["ID", "Name", "Phone", "Email", "Address", "Age", "Loyalty Points"])
-                for item in self.tree.get_children():
-                    writer.writerow(self.tree.item(item)['values'])
-
-            messagebox.showinfo("Exported", f"Customer data saved to:\n{file_path}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to export: {str(e)}")
-    def sort_by_column(self, col):
-        data = [(self.tree.set(k, col), k) for k in self.tree.get_children("")]
-        data.sort(reverse=getattr(self, "sort_reverse", False))
-
-        for index, (_, k) in enumerate(data):
-            self.tree.move(k, '', index)
-
-        self.sort_reverse = not getattr(self, "sort_reverse", False)
-        self.sort_column = col
+        self.runner.submit(self.write_csv, file_path, self.page_filter(),
+                           on_done=lambda _: messagebox.showinfo("Exported", f"Customer data saved to:\n{file_path}"),
+                           on_error=lambda e: messagebox.showerror("Error", f"Failed to export: {str(e)}"))
+
+    def write_csv(self, file_path, filters):
+        import csv
+        with open(file_path, "w", newline='', encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["ID", "Name", "Phone", "Email", "Address", "Age", "Loyalty Points"])
+            for cust in Customer.iter_pages(columns=self.LIST_COLUMNS, **filters):
+                writer.writerow([
+                    cust['customer_id'], cust['name'], cust['phone'] or "N/A", cust['email'] or "N/A",
+                    cust['address'] or "N/A", cust['age'] or "N/A", cust['loyalty_points'] or 0
+                ])
+
     def print_customer_details(self):
         if not self.current_customer:
             messagebox.showwarning("Warning", "Select a customer first.")
@@ -240,36 +264,55 @@ class CustomerManager:
         ⭐ Points: {cust[6]}
         """
         messagebox.showinfo("Customer Details", details.strip())
+    def matching_customers(self, filters):
+        """All customers matching the given search and filter, fetched page by page."""
+        return Customer.iter_pages(columns=["customer_id", "age", "loyalty_points"], **filters)
+
+    def show_report(self, report, title):
+        """Compute report(filters) -> message in the background and show it, or its error, when done."""
+        self.runner.submit(report, self.page_filter(),
+                           on_done=lambda message: messagebox.showinfo(title, message),
+                           on_error=lambda e: messagebox.showerror("Error", f"Failed to load customers: {str(e)}"))
+
     def show_statistics(self):
-        total_customers = len(self.tree.get_children())
-        vip_customers = sum(
-            1 for item in self.tree.get_children()
-            if int(self.tree.item(item)['values'][6]) >= 1000
-        )
+        self.show_report(self.statistics_report, "Customer Summary")
+
+    def statistics_report(self, filters):
+        total_customers = 0
+        vip_customers = 0
+        for cust in self.matching_customers(filters):
+            total_customers += 1
+            if (cust['loyalty_points'] or 0) >= 1000:
+                vip_customers += 1
         regular_customers = total_customers - vip_customers
 
-        message = (
+        return (
             f"📋 Total Customers: {total_customers}\n"
             f"🌟 VIP Customers (≥ 1000 pts): {vip_customers}\n"
             f"👥 Regular Customers: {regular_customers}"
         )
-        messagebox.showinfo("Customer Summary", message)
 
     def show_loyalty_points(self):
-        total = sum(int(self.tree.item(i)['values'][6]) for i in self.tree.get_children())
-        average = total / len(self.tree.get_children()) if self.tree.get_children() else 0
-        message = (
+        self.show_report(self.loyalty_points_report, "Loyalty Points")
+
+    def loyalty_points_report(self, filters):
+        points = [cust['loyalty_points'] or 0 for cust in self.matching_customers(filters)]
+        total = sum(points)
+        average = total / len(points) if points else 0
+        return (
             f"🏆 Total Loyalty Points: {total}\n"
             f"📈 Average Points per Customer: {average:.2f}"
         )
-        messagebox.showinfo("Loyalty Points", message)
 
     def show_age_distribution(self):
+        self.show_report(self.age_distribution_report, "Age Group Distribution")
+
+    def age_distribution_report(self, filters):
         from collections import defaultdict
 
         age_groups = defaultdict(int)
-        for i in self.tree.get_children():
-            age = self.tree.item(i)['values'][5]
+        for cust in self.matching_customers(filters):
+            age = cust['age']
             try:
                 age = int(age)
                 if age < 18:
@@ -287,45 +330,6 @@ class CustomerManager:
                 continue
 
         if not age_groups:
-            messagebox.showinfo("Age Distribution", "No valid age data available.")
-            return
-
-        distribution = "\n".join(f"{grp}: {count} customer(s)" for grp, count in sorted(age_groups.items()))
-        messagebox.showinfo("Age Group Distribution", distribution)
-    def sort_by_loyalty_points(self):
-        """Sort the treeview by Loyalty Points."""
-        rows = [(self.tree.set(k, "Points"), k) for k in self.tree.get_children()]
-        try:
-            # التأكد من القيم صحيحة للفرز
-            rows.sort(key=lambda x: int(x[0]), reverse=self.sort_points_reverse)
-        except ValueError:
-            messagebox.showerror("Error", "Invalid point values in data")
-            return
-
-        for index, (_, k) in enumerate(rows):
-            self.tree.move(k, '', index)
-
-        self.sort_points_reverse = not self.sort_points_reverse
-    def sort_by_age(self):
-        data = [
-            (self.tree.set(item, "Age"), item)
-            for item in self.tree.get_children()
-            if self.tree.set(item, "Age") != "N/A"
-        ]
-
-        try:
-            data = [(int(age), item) for age, item in data]
-            data.sort(reverse=self.sort_by_age_reverse)
-
-            for idx, (_, item) in enumerate(data):
-                self.tree.move(item, '', idx)
-
-            # تحديث عنوان العمود
-            arrow = "🔽" if self.sort_by_age_reverse else "🔼"
-            self.tree.heading("Age", text=f"Age {arrow}", command=self.sort_by_age)
-
-            # عكس الاتجاه للنقرة القادمة
-            self.sort_by_age_reverse = not self.sort_by_age_reverse
+            return "No valid age data available."
 
-        except Exception as e:
-            messagebox.showerror("Error", f"Sorting error: {str(e)}")
\ No newline at end of file
+        return "\n".join(f"{grp}: {count} customer(s)" for grp, count in sorted(age_groups.items()))
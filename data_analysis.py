@@ -5,7 +5,8 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from datetime import datetime, timedelta
 from database import Database
-import threading
+from task_runner import TaskRunner, current_task
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import tkinter as tk
 from tkinter import messagebox
 import sys
@@ -20,6 +21,9 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class MedicineAnalysis:
+    # Tables read by load_data, locked for a moment so all loads see one snapshot
+    TABLES = ("orders", "order_items", "medicines", "employees")
+
     def __init__(self, progress_callback=None, max_rows=100000):
         self.progress_callback = progress_callback
         self.max_rows = max_rows
@@ -29,6 +33,7 @@ class MedicineAnalysis:
         self.medicines_df = pd.DataFrame()
         self.employees_df = pd.DataFrame()
         self.sales_merged = pd.DataFrame()
+        self.order_count = 0
         self.configure_plots()
         
     def configure_plots(self):
@@ -45,62 +50,37 @@ class MedicineAnalysis:
         start_time = time.time()
         self.update_progress("Loading data...")
         try:
-            # Check dataset size with fallback
-            order_count = 0
-            order_item_count = 0
-            try:
-                order_count_result = Database.fetch_all("SELECT COUNT(*) FROM orders")
-                order_item_count_result = Database.fetch_all("SELECT COUNT(*) FROM order_items")
-                order_count = order_count_result[0][0] if order_count_result else 0
-                order_item_count = order_item_count_result[0][0] if order_item_count_result else 0
-                logger.info(f"Dataset size: {order_count} orders, {order_item_count} order items")
-                if order_count > self.max_rows or order_item_count > self.max_rows:
-                    self.update_progress(f"Warning: Dataset too large ({order_count} orders, {order_item_count} order items). Proceeding with limited data.")
-            except Exception as db_error:
-                error_msg = f"Failed to check dataset size: {str(db_error)}"
-                logger.error(f"{error_msg}\n{traceback.format_exc()}")
-                self.update_progress(f"Warning: {error_msg}. Proceeding without size check.")
-
-            # Limit to last 90 days
-            cutoff_date = (datetime.today() - timedelta(days=90)).strftime('%Y-%m-%d')
-            orders_query = f"SELECT order_id, employee_id, order_date FROM orders WHERE order_date >= '{cutoff_date}'"
-            order_items_query = "SELECT order_id, medicine_id, quantity, unit_price FROM order_items"
-            medicines_query = "SELECT medicine_id, name, quantity FROM medicines"
-            employees_query = "SELECT employee_id, name FROM employees"
-
+            # One loader per table, each on its own pooled connection; they run
+            # concurrently, so the load takes about as long as the slowest one
+            loaders = {
+                "orders": self.load_orders,
+                "order items": self.load_order_items,
+                "medicines": self.load_medicines,
+                "employees": self.load_employees,
+            }
             try:
-                # Fetch data with individual try-except blocks for better debugging
-                self.update_progress("Fetching orders...")
-                orders = Database.fetch_all(orders_query)
-                self.orders_df = pd.DataFrame(orders, columns=['order_id', 'employee_id', 'order_date'])
-                
-                self.update_progress("Fetching order items...")
-                order_items = Database.fetch_all(order_items_query)
-                self.order_items_df = pd.DataFrame(order_items, columns=['order_id', 'medicine_id', 'quantity', 'unit_price'])
-                # Convert to numeric, coercing errors to NaN
-                self.order_items_df['quantity'] = pd.to_numeric(self.order_items_df['quantity'], errors='coerce')
-                self.order_items_df['unit_price'] = pd.to_numeric(self.order_items_df['unit_price'], errors='coerce')
-                # Log data types for debugging
-                logger.info(f"order_items_df dtypes:\n{self.order_items_df.dtypes}")
-                # Calculate total_price, handling NaN values
-                self.order_items_df['total_price'] = self.order_items_df['unit_price'] * self.order_items_df['quantity']
-                # Replace NaN in total_price with 0
-                self.order_items_df['total_price'] = self.order_items_df['total_price'].fillna(0)
-                
-                self.update_progress("Fetching medicines...")
-                medicines = Database.fetch_all(medicines_query)
-                self.medicines_df = pd.DataFrame(medicines, columns=['medicine_id', 'name', 'quantity'])
-                self.medicines_df['quantity'] = pd.to_numeric(self.medicines_df['quantity'], errors='coerce')
-                
-                self.update_progress("Fetching employees...")
-                employees = Database.fetch_all(employees_query)
-                self.employees_df = pd.DataFrame(employees, columns=['employee_id', 'name'])
-                
+                with Database.snapshot_connections(len(loaders), self.TABLES) as connections, \
+                        ThreadPoolExecutor(max_workers=len(loaders), thread_name_prefix="analysis-load") as pool:
+                    futures = {pool.submit(load, conn): name
+                               for (name, load), conn in zip(loaders.items(), connections)}
+                    for done, future in enumerate(as_completed(futures), 1):
+                        name = futures[future]
+                        try:
+                            rows = future.result()
+                        except Exception as db_error:
+                            raise Exception(f"Fetching {name} failed: {str(db_error)}") from db_error
+                        self.update_progress(f"Loaded {name}: {rows} rows ({done}/{len(futures)} tables)")
             except Exception as db_error:
                 error_msg = f"Database query failed: {str(db_error)}"
                 logger.error(f"{error_msg}\n{traceback.format_exc()}")
                 raise Exception(error_msg)
 
+            # Sizes from the same snapshot as the data
+            order_item_count = len(self.order_items_df)
+            logger.info(f"Dataset size: {self.order_count} orders, {order_item_count} order items")
+            if self.order_count > self.max_rows or order_item_count > self.max_rows:
+                self.update_progress(f"Warning: Dataset too large ({self.order_count} orders, {order_item_count} order items). Proceeding with limited data.")
+
             # Cache merged data with explicit suffixes
             self.update_progress("Merging data...")
             self.sales_merged = (self.order_items_df
@@ -113,7 +93,49 @@ class MedicineAnalysis:
             error_msg = f"Error loading data: {str(e)}"
             logger.error(f"{error_msg}\n{traceback.format_exc()}")
             raise Exception(error_msg)
-    
+
+    def load_orders(self, conn):
+        """Orders of the last 90 days, and the total order count; returns the rows loaded"""
+        count = Database.fetch_records("SELECT COUNT(*) FROM orders", connection=conn)
+        self.order_count = count[0][0] if count else 0
+        cutoff_date = (datetime.today() - timedelta(days=90)).strftime('%Y-%m-%d')
+        orders = Database.fetch_records(
+            "SELECT order_id, employee_id, order_date FROM orders WHERE order_date >= %s", (cutoff_date,),
+            connection=conn)
+        self.orders_df = pd.DataFrame(orders, columns=['order_id', 'employee_id', 'order_date'])
+        return len(self.orders_df)
+
+    def load_order_items(self, conn):
+        # Stream the largest table in chunks so only one chunk of raw rows is alive at a time
+        item_columns = ['order_id', 'medicine_id', 'quantity', 'unit_price']
+        item_frames = [
+            pd.DataFrame(rows, columns=item_columns)
+            for rows in Database.iter_chunks("SELECT order_id, medicine_id, quantity, unit_price FROM order_items",
+                                             chunk_size=50000, dictionary=False, connection=conn)
+        ]
+        items = pd.concat(item_frames, ignore_index=True) if item_frames else pd.DataFrame(columns=item_columns)
+        # Convert to numeric, coercing errors to NaN
+        items['quantity'] = pd.to_numeric(items['quantity'], errors='coerce')
+        items['unit_price'] = pd.to_numeric(items['unit_price'], errors='coerce')
+        # Log data types for debugging
+        logger.info(f"order_items_df dtypes:\n{items.dtypes}")
+        # Calculate total_price, replacing NaN with 0
+        items['total_price'] = (items['unit_price'] * items['quantity']).fillna(0)
+        self.order_items_df = items
+        return len(items)
+
+    def load_medicines(self, conn):
+        medicines = Database.fetch_records("SELECT medicine_id, name, quantity FROM medicines", connection=conn)
+        medicines_df = pd.DataFrame(medicines, columns=['medicine_id', 'name', 'quantity'])
+        medicines_df['quantity'] = pd.to_numeric(medicines_df['quantity'], errors='coerce')
+        self.medicines_df = medicines_df
+        return len(medicines_df)
+
+    def load_employees(self, conn):
+        employees = Database.fetch_records("SELECT employee_id, name FROM employees", connection=conn)
+        self.employees_df = pd.DataFrame(employees, columns=['employee_id', 'name'])
+        return len(self.employees_df)
+
     def analyze_top_medicines(self):
         start_time = time.time()
         self.update_progress("Analyzing top medicines...")
@@ -300,7 +322,8 @@ class AnalysisApp:
         self.root.geometry("1000x600")
         
         self.setup_ui()
-        self.analysis = MedicineAnalysis(self.update_progress, max_rows=100000)
+        self.runner = TaskRunner(self.root)
+        self.analysis = MedicineAnalysis(self.report_progress, max_rows=100000)
     
     def setup_ui(self):
         self.main_frame = tk.Frame(self.root, padx=20, pady=20)
@@ -322,8 +345,13 @@ class AnalysisApp:
         self.status_label = tk.Label(self.main_frame, text="", fg='blue')
         self.status_label.pack(pady=5)
     
+    @staticmethod
+    def report_progress(message):
+        # Called on the analysis task's thread; update_progress shows it on the Tk thread
+        current_task().progress(message)
+
     def update_progress(self, message):
-        self.root.after(0, lambda: self.status_label.config(text=message, fg='blue'))
+        self.status_label.config(text=message, fg='blue')
     
     def run_analysis_threaded(self):
         self.run_button.config(state=tk.DISABLED)
@@ -332,17 +360,11 @@ class AnalysisApp:
         for widget in self.results_frame.winfo_children():
             widget.destroy()
         
-        threading.Thread(target=self._run_analysis_background, daemon=True).start()
-    
-    def _run_analysis_background(self):
-        try:
-            results = self.analysis.run_full_analysis()
-            self.root.after(0, lambda: self.show_results(results))
-        except Exception as e:
-            error_msg = str(e)
-            self.root.after(0, lambda: self.show_error(error_msg))
-        finally:
-            self.root.after(0, lambda: self.run_button.config(state=tk.NORMAL))
+        self.runner.submit(self.analysis.run_full_analysis,
+                           on_done=self.show_results,
+                           on_error=lambda e: self.show_error(str(e)),
+                           on_progress=self.update_progress,
+                           on_finally=lambda: self.run_button.config(state=tk.NORMAL))
     
     def show_results(self, results):
         self.status_label.config(text="Analysis complete!", fg='green')
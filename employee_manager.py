@@ -6,10 +6,18 @@ from database import Employee
 import csv
 from tkinter import filedialog
 from datetime import datetime
+from search_controller import SearchController
+from virtual_tree import VirtualTree
+from table_sorter import TableSorter, field, text
+from task_runner import TaskRunner
 class EmployeeManager:
+    LIST_COLUMNS = ["employee_id", "name", "role", "phone", "email", "salary", "hire_date"]
+
     def __init__(self, parent_frame):
         self.frame = ttkb.Frame(parent_frame, padding=10, bootstyle="light")
         self.current_employee = None
+        self.runner = TaskRunner(self.frame)
+        self.load_task = None
         self.setup_ui()
 
     def setup_ui(self):
@@ -20,7 +28,9 @@ class EmployeeManager:
         ttkb.Label(search_frame, text="🔍 Search:", font=("Helvetica", 12)).pack(side=LEFT)
         self.search_entry = ttkb.Entry(search_frame, width=30)
         self.search_entry.pack(side=LEFT, padx=5)
-        self.search_entry.bind("<KeyRelease>", lambda e: self.load_employees())
+        self.search = SearchController(self.frame, self.fetch_employees, self.show_employees,
+                                       on_error=self.show_load_error, runner=self.runner)
+        self.search.attach(self.search_entry, self.begin_search)
 
         # Treeview
         self.tree = ttkb.Treeview(
@@ -42,10 +52,17 @@ class EmployeeManager:
             "Salary": 100,
             "Hire Date": 120
         }.items():
-            self.tree.heading(col, text=col, command=lambda c=col: self.sort_by_column(c))
+            self.tree.heading(col, text=col)
             self.tree.column(col, width=width, anchor=CENTER)
 
-        self.tree.bind("<<TreeviewSelect>>", self.on_employee_select)
+        # تمييز بصري للرواتب العالية
+        self.tree.tag_configure("highpay", background="", font=("Helvetica", 10, "bold"))
+        self.view = VirtualTree(self.tree, self.employee_values, self.employee_tags,
+                                on_select=self.on_employee_select, key=lambda emp: emp['employee_id'])
+        self.sorter = TableSorter(self.view, {
+            "ID": field('employee_id'), "Name": text('name'), "Role": text('role'), "Phone": text('phone'),
+            "Email": text('email'), "Salary": lambda emp: emp['salary'] or None, "Hire Date": field('hire_date'),
+        })
         ttkb.Label(search_frame, text="Filter by Role:").pack(side=LEFT, padx=(15, 5))
         self.role_filter = ttkb.Combobox(search_frame, state="readonly", width=15)
         self.role_filter['values'] = ["All", "Pharmacist", "Technician", "Cashier", "Manager", "Admin"]
@@ -72,60 +89,82 @@ class EmployeeManager:
         ttkb.Button(btn_frame, text="🔄 Refresh", command=self.load_employees, bootstyle="primary-outline", width=12).pack(side=RIGHT, padx=5)
         ttkb.Button(btn_frame, text="📤 Export CSV", command=self.export_to_csv, bootstyle="warning-outline", width=12).pack(side=RIGHT, padx=5)
         ttkb.Button(btn_frame, text="📊 Stats", command=self.show_statistics, bootstyle="info-outline", width=12).pack(side=LEFT, padx=5)
-        ttkb.Button(btn_frame, text="🔄 Sort by Salary", command=self.sort_by_salary, bootstyle="info-outline", width=12).pack(side=LEFT, padx=5)
+        ttkb.Button(btn_frame, text="🔄 Sort by Salary", command=lambda: self.sorter.sort("Salary"), bootstyle="info-outline", width=12).pack(side=LEFT, padx=5)
         ttkb.Button(btn_frame, text="📊 Hire Stats", command=self.show_hiring_statistics, bootstyle="info-outline", width=14).pack(side=LEFT, padx=5)
 
         self.load_employees()
 
-    def load_employees(self, search_term=None):
-        self.tree.delete(*self.tree.get_children())
+    def query_args(self, search_term=None):
+        """Search box, role and year filters as fetch_employees arguments"""
+        role_filter = self.role_filter.get() if hasattr(self, 'role_filter') else "All"
+        year_filter = self.year_filter.get() if hasattr(self, 'year_filter') else "All"
+        return search_term or self.search_entry.get(), role_filter, year_filter
 
-        try:
-            # قراءة الموظفين من قاعدة البيانات
-            employees = Employee.get_all(search_term or self.search_entry.get())
-
-            # فلترة حسب الوظيفة إذا تم اختيار غير "All"
-            if hasattr(self, 'role_filter'):
-                role_filter = self.role_filter.get()
-                if role_filter != "All":
-                    employees = [e for e in employees if e['role'] == role_filter]
-
-            # فلترة حسب سنة التوظيف إذا تم اختيار غير "All"
-            if hasattr(self, 'year_filter'):
-                year_filter = self.year_filter.get()
-                if year_filter != "All":
-                    employees = [
-                        e for e in employees
-                        if e['hire_date'] and e['hire_date'].year == int(year_filter)
-                    ]
-
-            # تعبئة الجدول
-            for emp in employees:
-                salary = f"${emp['salary']:.2f}" if emp['salary'] else "N/A"
-                hire_date = emp['hire_date'].strftime("%Y-%m-%d") if emp['hire_date'] else "N/A"
-                tag = "highpay" if emp['salary'] and emp['salary'] >= 2000 else ""
-
-                self.tree.insert("", "end", values=(
-                    emp['employee_id'],
-                    emp['name'],
-                    emp['role'] or "N/A",
-                    emp['phone'] or "N/A",
-                    emp['email'] or "N/A",
-                    salary,
-                    hire_date
-                ), tags=(tag,))
-
-            # تمييز بصري للرواتب العالية
-            self.tree.tag_configure("highpay", background="", font=("Helvetica", 10, "bold"))
+    def begin_search(self):
+        """Arguments for a search; a reload still in flight would render over its result, so it is dropped"""
+        self.cancel_load()
+        return self.query_args()
 
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load employees: {str(e)}")
+    def cancel_load(self):
+        if self.load_task is not None:
+            self.load_task.cancel()
+            self.load_task = None
+
+    def load_employees(self, search_term=None):
+        self.search.cancel()
+        self.cancel_load()
+        self.load_task = self.runner.submit(self.fetch_employees, *self.query_args(search_term),
+                                            on_done=self.show_loaded, on_error=self.show_load_error)
+
+    def show_load_error(self, error):
+        messagebox.showerror("Error", f"Failed to load employees: {str(error)}")
+
+    def fetch_employees(self, search_term, role_filter, year_filter):
+        # قراءة الموظفين من قاعدة البيانات
+        employees = Employee.get_all(search_term, columns=self.LIST_COLUMNS, fresh=True)
+
+        # فلترة حسب الوظيفة إذا تم اختيار غير "All"
+        if role_filter != "All":
+            employees = [e for e in employees if e['role'] == role_filter]
+
+        # فلترة حسب سنة التوظيف إذا تم اختيار غير "All"
+        if year_filter != "All":
+            employees = [
+                e for e in employees
+                if e['hire_date'] and e['hire_date'].year == int(year_filter)
+            ]
+        return employees
+
+    def show_loaded(self, employees):
+        self.load_task = None
+        self.show_employees(employees)
+
+    def show_employees(self, employees):
+        # تعبئة الجدول
+        self.view.reconcile(employees)
+
+    def after_save(self, message):
+        self.load_employees()
+        messagebox.showinfo("Success", message)
+
+    def employee_values(self, emp):
+        return (
+            emp['employee_id'],
+            emp['name'],
+            emp['role'] or "N/A",
+            emp['phone'] or "N/A",
+            emp['email'] or "N/A",
+            f"${emp['salary']:.2f}" if emp['salary'] else "N/A",
+            emp['hire_date'].strftime("%Y-%m-%d") if emp['hire_date'] else "N/A"
+        )
 
+    def employee_tags(self, emp):
+        return ("highpay",) if emp['salary'] and emp['salary'] >= 2000 else ()
 
-    def on_employee_select(self, event):
-        selected = self.tree.selection()
-        if selected:
-            self.current_employee = self.tree.item(selected[0])['values']
+
+    def on_employee_select(self, emp):
+        if emp:
+            self.current_employee = self.view.values(emp)
             self.edit_btn.config(state=NORMAL)
             self.delete_btn.config(state=NORMAL)
         else:
@@ -148,9 +187,9 @@ class EmployeeManager:
         if dialog.result:
             try:
                 dialog.result['salary'] = float(dialog.result['salary']) if dialog.result['salary'] else None
-                Employee.create(dialog.result)
-                self.load_employees()
-                messagebox.showinfo("Success", "Employee added successfully")
+                self.runner.submit(Employee.create, dialog.result,
+                                   on_done=lambda _: self.after_save("Employee added successfully"),
+                                   on_error=lambda e: messagebox.showerror("Error", f"Failed to add employee: {str(e)}"))
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to add employee: {str(e)}")
 
@@ -180,9 +219,9 @@ class EmployeeManager:
         if dialog.result:
             try:
                 dialog.result['salary'] = float(dialog.result['salary']) if dialog.result['salary'] else None
-                Employee.update(employee_id, dialog.result)
-                self.load_employees()
-                messagebox.showinfo("Success", "Employee updated successfully")
+                self.runner.submit(Employee.update, employee_id, dialog.result,
+                                   on_done=lambda _: self.after_save("Employee updated successfully"),
+                                   on_error=lambda e: messagebox.showerror("Error", f"Failed to update employee: {str(e)}"))
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to update employee: {str(e)}")
 
@@ -191,46 +230,36 @@ class EmployeeManager:
             return
 
         if messagebox.askyesno("Confirm Deletion", "Are you sure you want to delete this employee?"):
-            try:
-                Employee.delete(self.current_employee[0])
-                self.load_employees()
-                messagebox.showinfo("Success", "Employee deleted successfully")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to delete employee: {str(e)}")
+            self.runner.submit(Employee.delete, self.current_employee[0],
+                               on_done=lambda _: self.after_save("Employee deleted successfully"),
+                               on_error=lambda e: messagebox.showerror("Error", f"Failed to delete employee: {str(e)}"))
                 
     def export_to_csv(self):
         file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")])
         if not file_path:
             return
 
-        try:
-            with open(file_path, mode="w", newline="", encoding="utf-8") as file:
-                writer = csv.writer(file)
-
-                # Write column headers
-                headers = [self.tree.heading(col)["text"] for col in self.tree["columns"]]
-                writer.writerow(headers)
+        headers = [self.tree.heading(col)["text"] for col in self.tree["columns"]]
+        self.runner.submit(self.write_csv, file_path, headers, self.view.displayed(),
+                           on_done=lambda _: messagebox.showinfo("Success", "Data exported successfully!"),
+                           on_error=lambda e: messagebox.showerror("Error", f"Failed to export CSV: {str(e)}"))
 
-                # Write data rows
-                for row_id in self.tree.get_children():
-                    row = self.tree.item(row_id)["values"]
-                    writer.writerow(row)
-
-            messagebox.showinfo("Success", "Data exported successfully!")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to export CSV: {str(e)}")
-    def sort_by_column(self, col):
-        data = [(self.tree.set(k, col), k) for k in self.tree.get_children("")]
-        data.sort(reverse=getattr(self, "sort_reverse", False))
+    def write_csv(self, file_path, headers, rows):
+        with open(file_path, mode="w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
 
-        for index, (_, k) in enumerate(data):
-            self.tree.move(k, '', index)
+            # Write column headers
+            writer.writerow(headers)
 
-        self.sort_reverse = not getattr(self, "sort_reverse", False)
-        self.sort_column = col
+            # Write data rows
+            writer.writerows(rows)
 
     def show_statistics(self):
-        employees = Employee.get_all()
+        self.runner.submit(lambda: Employee.get_all(columns=["employee_id", "role", "salary"], fresh=True),
+                           on_done=self.show_employee_stats,
+                           on_error=lambda e: messagebox.showerror("Error", f"Failed to show stats: {str(e)}"))
+
+    def show_employee_stats(self, employees):
         total = len(employees)
         roles = {}
         salaries = []
@@ -247,21 +276,12 @@ class EmployeeManager:
 
         msg = f"Total Employees: {total}\n\nRole Distribution:\n{role_info}\n\nAvg Salary: ${salary_avg:.2f}\nMax Salary: ${salary_max:.2f}"
         messagebox.showinfo("Employee Stats", msg)
-    def sort_by_salary(self):
-        data = [(float(self.tree.set(k, "Salary").replace("$", "")), k) for k in self.tree.get_children() if self.tree.set(k, "Salary") != "N/A"]
-        data.sort(reverse=getattr(self, "sort_reverse", False))
-
-        for index, (_, k) in enumerate(data):
-            self.tree.move(k, '', index)
-
-        self.sort_reverse = not getattr(self, "sort_reverse", False)
-
     def show_hiring_statistics(self):
         """عرض عدد الموظفين حسب سنة التوظيف"""
         try:
             hiring_counts = {}
-            for row_id in self.tree.get_children():
-                hire_date_str = self.tree.item(row_id)['values'][6]
+            for values in self.view.displayed():
+                hire_date_str = values[6]
                 if hire_date_str and hire_date_str != "N/A":
                     year = hire_date_str.split("-")[0]
                     hiring_counts[year] = hiring_counts.get(year, 0) + 1
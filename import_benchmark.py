@@ -0,0 +1,65 @@
+"""Import-time breakdown of the app's startup modules, from python -X importtime.
+
+    python import_benchmark.py [--top N] [module ...]
+
+Imports each module (default: main) in a fresh interpreter, prints the
+slowest imports by cumulative time and exits with status 1 if startup pulls
+in the analytics stack, which must only load when Analysis is opened.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# Loaded on demand by PharmacyApp.open_analysis, never at startup
+LAZY_MODULES = ("data_analysis", "pandas", "matplotlib", "seaborn")
+
+
+def import_times(module: str):
+    """(self_us, cumulative_us, depth, name) for every module imported by `import module`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"import {module} failed")
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        times.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return times
+
+
+def report(module: str, top: int) -> bool:
+    """Print the breakdown for module; False if it imports any of LAZY_MODULES"""
+    times = import_times(module)
+    total = sum(self_us for self_us, _, _, _ in times)
+    print(f"import {module}: {total / 1000:.1f} ms, {len(times)} modules")
+    for self_us, cumulative_us, depth, name in sorted(times, key=lambda t: -t[1])[:top]:
+        print(f"  {cumulative_us / 1000:9.1f} ms cumulative {self_us / 1000:8.1f} ms self  {'  ' * depth}{name}")
+    eager = sorted({name for _, _, _, name in times if name.split(".")[0] in LAZY_MODULES})
+    if eager:
+        print(f"  FAIL: imported at startup: {', '.join(eager)}")
+    return not eager
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=["main"])
+    parser.add_argument("--top", type=int, default=15, help="number of slowest imports to list")
+    args = parser.parse_args()
+    ok = True
+    for module in args.modules:
+        try:
+            ok = report(module, args.top) and ok
+        except RuntimeError as e:
+            print(f"import {module}: {e}")
+            return 2
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
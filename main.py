@@ -4,6 +4,7 @@ import os
 
 from logintoapp import LoginWindow
 from pharmacy_app import PharmacyApp
+from startup_warmup import StartupWarmup
 
 class MainApp:
     def __init__(self):
@@ -13,6 +14,9 @@ class MainApp:
         self.app = ttkb.Window(themename=self.style_name)
         self.app.withdraw()  # Hide main window at first
 
+        # Connect and fetch the reference lists while the user types credentials
+        self.warmup = StartupWarmup().start()
+
         self.login_window = LoginWindow(self.app)
         self.app.wait_window(self.login_window.root)
 
@@ -3,16 +3,24 @@ from ttkbootstrap.constants import *
 from tkinter import messagebox
 from datetime import datetime
 import traceback
-from database import Medicine, Supplier, Database
+from database import Medicine, Supplier, Database, QuerySpec
 from dialog import CommonDialog
+from search_controller import SearchController
+from virtual_tree import VirtualTree
+from table_sorter import TableSorter, field, text
+from task_runner import TaskRunner
 import csv
 from tkinter import filedialog
 class MedicineManager:
+    LIST_COLUMNS = ["medicine_id", "name", "quantity", "price", "expiry_date", "category"]
+
     def __init__(self, parent):
         self.frame = ttkb.Frame(parent, padding=10, bootstyle="light")
         self.current_medicine = None
-        self.selected_row = None
+        self.highlight_low_stock = False
         self.categories = ["All"]
+        self.runner = TaskRunner(self.frame)
+        self.load_task = None
         self.setup_ui()
 
     def setup_ui(self):
@@ -22,7 +30,9 @@ class MedicineManager:
         ttkb.Label(top_frame, text="🔍 Search:").pack(side=LEFT)
         self.search_entry = ttkb.Entry(top_frame, width=30)
         self.search_entry.pack(side=LEFT, padx=5)
-        self.search_entry.bind("<KeyRelease>", lambda e: self.load_medicines())
+        self.search = SearchController(self.frame, Medicine.find, self.show_medicines, on_error=self.show_load_error,
+                                       runner=self.runner)
+        self.search.attach(self.search_entry, self.begin_search)
 
         ttkb.Label(top_frame, text="Category:").pack(side=LEFT, padx=(15, 5))
         self.category_combo = ttkb.Combobox(top_frame, state="readonly", width=20)
@@ -50,7 +60,15 @@ class MedicineManager:
             self.tree.heading(col, text=col)
             self.tree.column(col, width=width, anchor=CENTER)
 
-        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.tag_configure("highlighted", background="#0078D7", foreground="white")
+        self.tree.tag_configure("lowstock", background="#FFD700")  # لون أصفر
+        self.view = VirtualTree(self.tree, self.medicine_values, self.medicine_tags,
+                                on_select=self.on_select, selected_tag="highlighted",
+                                key=lambda med: med['medicine_id'])
+        self.sorter = TableSorter(self.view, {
+            "ID": field('medicine_id'), "Name": text('name'), "Qty": field('quantity'), "Price": field('price'),
+            "Expiry": field('expiry_date'), "Category": text('category'), "Supplier": text('supplier_name'),
+        })
 
         btn_frame = ttkb.Frame(self.frame)
         btn_frame.pack(fill=X, padx=10, pady=10)
@@ -66,8 +84,8 @@ class MedicineManager:
         ttkb.Button(btn_frame, text="⏰ Expiry Check", command=self.check_expiry, bootstyle="warning-outline", width=16).pack(side=LEFT, padx=5)
         ttkb.Button(btn_frame, text="🔄 Refresh", command=self.load_medicines, bootstyle="primary-outline", width=12).pack(side=RIGHT, padx=5)
         ttkb.Button(btn_frame, text="⚠️ Highlight Low Stock", command=self.filter_low_stock, bootstyle="warning-outline", width=18).pack(side=LEFT, padx=5)
-        ttkb.Button(btn_frame, text="⬆ Sort by Price", command=self.sort_by_price, bootstyle="secondary-outline", width=16).pack(side=LEFT, padx=5)
-        ttkb.Button(btn_frame, text="⬇ Sort by Price", command=self.sort_by_price_desc, bootstyle="secondary-outline", width=16).pack(side=LEFT, padx=5)
+        ttkb.Button(btn_frame, text="⬆ Sort by Price", command=lambda: self.sorter.sort("Price", reverse=False), bootstyle="secondary-outline", width=16).pack(side=LEFT, padx=5)
+        ttkb.Button(btn_frame, text="⬇ Sort by Price", command=lambda: self.sorter.sort("Price", reverse=True), bootstyle="secondary-outline", width=16).pack(side=LEFT, padx=5)
         ttkb.Button(btn_frame, text="📤 Export CSV", command=self.export_to_csv, bootstyle="secondary-outline", width=14).pack(side=LEFT, padx=5)
         ttkb.Button(btn_frame, text="📊 Stats", command=self.show_stats, bootstyle="info-outline", width=10).pack(side=LEFT, padx=5)
 
@@ -75,52 +93,77 @@ class MedicineManager:
         self.load_medicines()
 
     def load_categories(self):
-        try:
-            rows = Database.fetch_all("SELECT DISTINCT category FROM medicines WHERE category IS NOT NULL")
-            self.categories = ["All"] + [r['category'] for r in rows if r['category']]
-            self.category_combo['values'] = self.categories
-            self.category_combo.current(0)
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load categories: {str(e)}")
+        self.runner.submit(Medicine.get_distinct, "category", on_done=self.show_categories,
+                           on_error=lambda e: messagebox.showerror("Error", f"Failed to load categories: {str(e)}"))
 
-    def highlight_selected_row(self):
-        if self.selected_row:
-            self.tree.item(self.selected_row, tags=())
-        selected = self.tree.selection()
-        if selected:
-            self.selected_row = selected[0]
-            self.tree.item(self.selected_row, tags=("highlighted",))
-            self.tree.tag_configure("highlighted", background="#0078D7", foreground="white")
+    def show_categories(self, categories):
+        self.categories = ["All"] + [c for c in categories if c]
+        self.category_combo['values'] = self.categories
+        self.category_combo.current(0)
 
-    def load_medicines(self):
-        search_term = self.search_entry.get()
+    def query_spec(self):
+        """Search box and category filter as a QuerySpec (rows include supplier_name)"""
+        spec = QuerySpec(columns=self.LIST_COLUMNS).match(self.search_entry.get())
         selected_category = self.category_combo.get()
+        if selected_category and selected_category != "All":
+            spec.where("category", "=", selected_category)
+        return spec
+
+    def begin_search(self):
+        """Arguments for a search; a reload still in flight would render over its result, so it is dropped"""
+        self.cancel_load()
+        return (self.query_spec(),)
+
+    def cancel_load(self):
+        if self.load_task is not None:
+            self.load_task.cancel()
+            self.load_task = None
 
-        for row in self.tree.get_children():
-            self.tree.delete(row)
+    def load_medicines(self):
+        self.search.cancel()
+        self.cancel_load()
+        self.load_task = self.runner.submit(self.fetch_medicines, self.query_spec(), on_done=self.show_loaded,
+                                            on_error=self.show_load_error)
+
+    def fetch_medicines(self, spec):
+        # Bypass the model cache so Refresh shows other terminals' sales and stock changes
+        return Medicine.find(spec, fresh=True)
+
+    def show_loaded(self, medicines):
+        self.load_task = None
+        self.show_medicines(medicines)
+
+    def show_medicines(self, medicines):
+        self.highlight_low_stock = False
+        self.view.reconcile(medicines)
+
+    def medicine_values(self, med):
+        return (
+            med['medicine_id'],
+            med['name'],
+            med['quantity'],
+            f"${med['price']:.2f}",
+            med['expiry_date'].strftime("%Y-%m-%d") if med['expiry_date'] else "N/A",
+            med['category'] or "N/A",
+            med.get('supplier_name', "N/A")
+        )
+
+    def medicine_tags(self, med):
+        return ("lowstock",) if self.highlight_low_stock and self.is_low_stock(med) else ()
 
+    @staticmethod
+    def is_low_stock(med):
         try:
-            medicines = Medicine.get_all(search_term if search_term else None, include_supplier=True)
-            for med in medicines:
-                if selected_category != "All" and med.get('category', "N/A") != selected_category:
-                    continue
-                self.tree.insert("", ttkb.END, values=(
-                    med['medicine_id'],
-                    med['name'],
-                    med['quantity'],
-                    f"${med['price']:.2f}",
-                    med['expiry_date'].strftime("%Y-%m-%d") if med['expiry_date'] else "N/A",
-                    med['category'] or "N/A",
-                    med.get('supplier_name', "N/A")
-                ))
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load medicines: {str(e)}")
+            return int(med['quantity']) < 10
+        except (TypeError, ValueError):
+            return False
+
+    def show_load_error(self, error):
+        messagebox.showerror("Error", f"Failed to load medicines: {str(error)}")
 
-    def on_select(self, event):
-        self.highlight_selected_row()
-        selected = self.tree.selection()
-        if selected:
-            self.current_medicine = self.tree.item(selected[0])['values']
+    def on_select(self, med):
+        if med:
+            self.current_medicine = self.view.values(med)
             self.edit_btn.config(state=NORMAL)
             self.delete_btn.config(state=NORMAL)
         else:
@@ -128,23 +171,34 @@ class MedicineManager:
             self.edit_btn.config(state=DISABLED)
             self.delete_btn.config(state=DISABLED)
 
+    def after_save(self, message):
+        self.load_medicines()
+        messagebox.showinfo("Success", message)
+
     def check_expiry(self):
-        try:
-            medicines = Medicine.get_all()
-            current_date = datetime.now().date()
-            expired = [med for med in medicines if med['expiry_date'] and med['expiry_date'] < current_date]
-            if not expired:
-                messagebox.showinfo("Expiry Check", "✅ No expired medicines found!")
-                return
-            message = "\n".join([
-                f"{med['name']} (Qty: {med['quantity']}, Expired: {med['expiry_date'].strftime('%Y-%m-%d')})"
-                for med in expired
-            ])
-            messagebox.showwarning("Expired Medicines", message)
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to check expiry dates: {str(e)}")
+        self.runner.submit(self.expired_medicines, on_done=self.show_expired,
+                           on_error=lambda e: messagebox.showerror("Error", f"Failed to check expiry dates: {str(e)}"))
+
+    def expired_medicines(self):
+        medicines = Medicine.get_all(columns=["medicine_id", "name", "quantity", "expiry_date"], fresh=True)
+        current_date = datetime.now().date()
+        return [med for med in medicines if med['expiry_date'] and med['expiry_date'] < current_date]
+
+    def show_expired(self, expired):
+        if not expired:
+            messagebox.showinfo("Expiry Check", "✅ No expired medicines found!")
+            return
+        message = "\n".join([
+            f"{med['name']} (Qty: {med['quantity']}, Expired: {med['expiry_date'].strftime('%Y-%m-%d')})"
+            for med in expired
+        ])
+        messagebox.showwarning("Expired Medicines", message)
 
     def add_medicine(self):
+        self.runner.submit(lambda: Supplier.get_all(columns=["supplier_id", "name"]), on_done=self.show_add_dialog,
+                           on_error=lambda e: messagebox.showerror("Error", f"Failed to add medicine: {str(e)}"))
+
+    def show_add_dialog(self, suppliers):
         fields = [
             ("Name", "name", True, False, None),
             ("Quantity", "quantity", True, False, None),
@@ -154,7 +208,7 @@ class MedicineManager:
             ("Batch Number", "batch_number", False, False, None),
             ("Category", "category", False, False, None),
             ("Description", "description", False, False, None),
-            ("Supplier", "supplier_id", False, True, [f"{s['supplier_id']} - {s['name']}" for s in Supplier.get_all()])
+            ("Supplier", "supplier_id", False, True, [f"{s['supplier_id']} - {s['name']}" for s in suppliers])
         ]
         dialog = CommonDialog(self.frame, "Add Medicine", fields)
         if dialog.result:
@@ -163,9 +217,9 @@ class MedicineManager:
                 data['price'] = float(data['price'])
                 data['quantity'] = int(data['quantity'])
                 data['supplier_id'] = int(data['supplier_id'].split(" - ")[0]) if data['supplier_id'] else None
-                Medicine.create(data)
-                self.load_medicines()
-                messagebox.showinfo("Success", "Medicine added successfully")
+                self.runner.submit(Medicine.create, data,
+                                   on_done=lambda _: self.after_save("Medicine added successfully"),
+                                   on_error=lambda e: messagebox.showerror("Error", f"Failed to add medicine: {str(e)}"))
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to add medicine: {str(e)}")
 
@@ -173,8 +227,16 @@ class MedicineManager:
         if not self.current_medicine:
             return
         medicine_id = self.current_medicine[0]
+        self.runner.submit(self.fetch_for_edit, medicine_id,
+                           on_done=lambda loaded: self.show_edit_dialog(medicine_id, *loaded),
+                           on_error=lambda e: messagebox.showerror("Error", f"Failed to edit medicine: {str(e)}"))
+
+    def fetch_for_edit(self, medicine_id):
+        return (Medicine.get_by_id(medicine_id, include_supplier=True, fresh=True),
+                Supplier.get_all(columns=["supplier_id", "name"]))
+
+    def show_edit_dialog(self, medicine_id, medicine_data, suppliers):
         try:
-            medicine_data = Medicine.get_by_id(medicine_id, include_supplier=True)
             if not medicine_data:
                 messagebox.showerror("Error", "Medicine not found")
                 return
@@ -188,12 +250,12 @@ class MedicineManager:
                 ("Batch Number", "batch_number", False, False, None),
                 ("Category", "category", False, False, None),
                 ("Description", "description", False, False, None),
-                ("Supplier", "supplier_id", False, True, [f"{s['supplier_id']} - {s['name']}" for s in Supplier.get_all()])
+                ("Supplier", "supplier_id", False, True, [f"{s['supplier_id']} - {s['name']}" for s in suppliers])
             ]
             for f in fields:
                 if f[1] == "supplier_id":
                     current = medicine_data.get("supplier_id")
-                    default = next((f"{s['supplier_id']} - {s['name']}" for s in Supplier.get_all() if s['supplier_id'] == current), "")
+                    default = next((f"{s['supplier_id']} - {s['name']}" for s in suppliers if s['supplier_id'] == current), "")
                     medicine_data["supplier_id"] = default
 
             dialog = CommonDialog(self.frame, "Edit Medicine", fields, initial_data=medicine_data)
@@ -202,9 +264,9 @@ class MedicineManager:
                 data['price'] = float(data['price'])
                 data['quantity'] = int(data['quantity'])
                 data['supplier_id'] = int(data['supplier_id'].split(" - ")[0]) if data['supplier_id'] else None
-                Medicine.update(medicine_id, data)
-                self.load_medicines()
-                messagebox.showinfo("Success", "Medicine updated successfully")
+                self.runner.submit(Medicine.update, medicine_id, data,
+                                   on_done=lambda _: self.after_save("Medicine updated successfully"),
+                                   on_error=lambda e: messagebox.showerror("Error", f"Failed to edit medicine: {str(e)}"))
         except Exception as e:
             messagebox.showerror("Error", f"Failed to edit medicine: {str(e)}")
 
@@ -216,118 +278,73 @@ class MedicineManager:
         if not messagebox.askyesno("Confirm Deletion", f"Delete {self.current_medicine[1]}?", icon="warning"):
             return
 
-        try:
-            medicine_id = self.current_medicine[0]
-            if self.is_medicine_referenced(medicine_id):
-                messagebox.showerror("Error", "Cannot delete, medicine linked with orders!")
-                return
+        self.runner.submit(self.delete_unreferenced, self.current_medicine[0], on_done=self.show_deleted,
+                           on_error=lambda e: messagebox.showerror("Error", f"Failed to delete medicine: {str(e)}"))
 
-            success = Medicine.delete(medicine_id)
-            if success:
-                self.load_medicines()
-                self.current_medicine = None
-                messagebox.showinfo("Success", "Medicine deleted successfully")
-            else:
-                messagebox.showerror("Error", "Failed to delete medicine")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to delete medicine: {str(e)}")
+    def delete_unreferenced(self, medicine_id):
+        """None if order items still refer to the medicine, else the result of Medicine.delete"""
+        if self.is_medicine_referenced(medicine_id):
+            return None
+        return Medicine.delete(medicine_id)
+
+    def show_deleted(self, success):
+        if success is None:
+            messagebox.showerror("Error", "Cannot delete, medicine linked with orders!")
+        elif success:
+            self.current_medicine = None
+            self.after_save("Medicine deleted successfully")
+        else:
+            messagebox.showerror("Error", "Failed to delete medicine")
 
     def is_medicine_referenced(self, medicine_id):
         try:
             result = Database.fetch_one("SELECT COUNT(*) FROM order_items WHERE medicine_id = %s", (medicine_id,))
-            return result['COUNT(*)'] > 0 if result else False
-        except Exception as e:
-            messagebox.showerror("Error", f"Could not check references: {str(e)}")
-            return True
-    def sort_by_price(self):
-        try:
-            items = []
-            for row in self.tree.get_children():
-                data = self.tree.item(row)["values"]
-                price = float(data[3].replace('$', ''))
-                items.append((price, data))
-
-            self.tree.delete(*self.tree.get_children())
-
-            items.sort(reverse=False if not hasattr(self, "price_sort_reverse") or self.price_sort_reverse else True)
-            self.price_sort_reverse = not getattr(self, "price_sort_reverse", False)
-
-            for _, data in items:
-                self.tree.insert("", ttkb.END, values=data)
-
         except Exception as e:
-            messagebox.showerror("Error", f"Sort failed: {str(e)}")
-            
-    def sort_by_price_desc(self):
-        try:
-            items = []
-            for row in self.tree.get_children():
-                data = self.tree.item(row)["values"]
-                price = float(data[3].replace('$', ''))
-                items.append((price, data))
-
-            self.tree.delete(*self.tree.get_children())
+            raise Exception(f"Could not check references: {str(e)}") from e
+        return result['COUNT(*)'] > 0 if result else False
 
-            items.sort(reverse=True)
-            for _, data in items:
-                self.tree.insert("", ttkb.END, values=data)
-
-        except Exception as e:
-            messagebox.showerror("Error", f"Sort failed: {str(e)}")
     def export_to_csv(self):
-        try:
-            file_path = filedialog.asksaveasfilename(
-                defaultextension=".csv",
-                filetypes=[("CSV Files", "*.csv")],
-                title="Save as CSV"
-            )
-            if not file_path:
-                return
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV Files", "*.csv")],
+            title="Save as CSV"
+        )
+        if not file_path:
+            return
 
-            with open(file_path, mode='w', newline='', encoding='utf-8') as file:
-                writer = csv.writer(file)
-                writer.writerow(["ID", "Name", "Quantity", "Price", "Expiry", "Category", "Supplier"])
-                for item in self.tree.get_children():
-                    writer.writerow(self.tree.item(item)['values'])
+        self.runner.submit(self.write_csv, file_path, self.view.displayed(),
+                           on_done=lambda _: messagebox.showinfo("Exported", f"Exported successfully to:\n{file_path}"),
+                           on_error=lambda e: messagebox.showerror("Error", f"Export failed: {str(e)}"))
+
+    def write_csv(self, file_path, rows):
+        with open(file_path, mode='w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(["ID", "Name", "Quantity", "Price", "Expiry", "Category", "Supplier"])
+            writer.writerows(rows)
 
-            messagebox.showinfo("Exported", f"Exported successfully to:\n{file_path}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Export failed: {str(e)}")
     def filter_low_stock(self):
         try:
-            # أزل التمييز السابق
-            for row in self.tree.get_children():
-                self.tree.item(row, tags=())
-            
-            low_count = 0
-            for row in self.tree.get_children():
-                quantity_str = self.tree.item(row)['values'][2]  # العمود الثالث هو الكمية
-                try:
-                    quantity = int(quantity_str)
-                    if quantity < 10:
-                        self.tree.item(row, tags=("lowstock",))
-                        low_count += 1
-                except ValueError:
-                    continue
-
-            self.tree.tag_configure("lowstock", background="#FFD700")  # لون أصفر
+            self.highlight_low_stock = True
+            self.view.refresh()
+            low_count = sum(1 for med in self.view.rows if self.is_low_stock(med))
 
             messagebox.showinfo("Low Stock Highlight", f"Highlighted {low_count} items with stock < 10")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to filter low stock: {str(e)}")
 
     def show_stats(self):
-        try:
-            medicines = Medicine.get_all()
-            total = len(medicines)
-            if total == 0:
-                messagebox.showinfo("Statistics", "No medicines available.")
-                return
-            total_price = sum(m['price'] for m in medicines if m['price'])
-            avg_price = total_price / total
-            messagebox.showinfo("Statistics", f"📦 Total Medicines: {total}\n💲 Average Price: ${avg_price:.2f}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load stats: {str(e)}")
+        self.runner.submit(self.price_statistics,
+                           on_done=lambda message: messagebox.showinfo("Statistics", message),
+                           on_error=lambda e: messagebox.showerror("Error", f"Failed to load stats: {str(e)}"))
+
+    def price_statistics(self):
+        medicines = Medicine.get_all(columns=["medicine_id", "price"], fresh=True)
+        total = len(medicines)
+        if total == 0:
+            return "No medicines available."
+        total_price = sum(m['price'] for m in medicines if m['price'])
+        avg_price = total_price / total
+        return f"📦 Total Medicines: {total}\n💲 Average Price: ${avg_price:.2f}"
 
 
 
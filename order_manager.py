@@ -1,12 +1,15 @@
+import asyncio
 import ttkbootstrap as ttkb
 from ttkbootstrap.constants import *
 from tkinter import messagebox
 from datetime import datetime
-from database import Order, Medicine, Customer, Employee, Database
+from database import Order, Medicine, Customer, Employee
 from PIL import Image, ImageDraw, ImageFont
 import os
 import tkinter as tk
 import subprocess
+from task_runner import TaskRunner
+from async_db import AsyncProxy, run_async
 
 class OrderManager:
     def __init__(self, parent_frame, on_order_saved=None):
@@ -14,6 +17,9 @@ class OrderManager:
         self.current_order = None
         self.order_items = []
         self.on_order_saved = on_order_saved
+        # The add-item lookup or checkout in flight; the order cannot be edited until it finishes
+        self.pending_task = None
+        self.runner = TaskRunner(self.frame)
         self.setup_ui()
 
     def setup_ui(self):
@@ -47,7 +53,8 @@ class OrderManager:
         self.quantity_entry = ttkb.Entry(add_item, width=33, font=("Helvetica", 10))
         self.quantity_entry.grid(row=1, column=1, pady=5)
 
-        ttkb.Button(add_item, text="➕ Add Item", command=self.add_item, bootstyle="success-outline", width=20).grid(row=2, column=1, pady=10)
+        self.add_item_btn = ttkb.Button(add_item, text="➕ Add Item", command=self.add_item, bootstyle="success-outline", width=20)
+        self.add_item_btn.grid(row=2, column=1, pady=10)
 
         items_frame = ttkb.LabelFrame(self.frame, text="📋 Order Items", padding=10, bootstyle="info")
         items_frame.pack(fill=BOTH, expand=True, padx=10, pady=(0, 10))
@@ -74,33 +81,55 @@ class OrderManager:
         btn_frame = ttkb.Frame(bottom_frame)
         btn_frame.pack(side=RIGHT)
 
-        ttkb.Button(btn_frame, text="🆕 New Order", command=self.new_order, bootstyle="primary-outline", width=12).pack(side=LEFT, padx=5)
-        ttkb.Button(btn_frame, text="💾 Save Order", command=self.save_order, bootstyle="success-outline", width=12).pack(side=LEFT, padx=5)
+        self.new_order_btn = ttkb.Button(btn_frame, text="🆕 New Order", command=self.new_order, bootstyle="primary-outline", width=12)
+        self.new_order_btn.pack(side=LEFT, padx=5)
+        self.save_btn = ttkb.Button(btn_frame, text="💾 Save Order", command=self.save_order, bootstyle="success-outline", width=12)
+        self.save_btn.pack(side=LEFT, padx=5)
         ttkb.Button(btn_frame, text="🖨️ Generate & Print Bill", command=self.generate_bill, bootstyle="warning-outline", width=18).pack(side=LEFT, padx=5)
-        ttkb.Button(btn_frame, text="🗑️ Delete Item", command=self.delete_item, bootstyle="danger-outline", width=12).pack(side=LEFT, padx=5)
+        self.delete_item_btn = ttkb.Button(btn_frame, text="🗑️ Delete Item", command=self.delete_item, bootstyle="danger-outline", width=12)
+        self.delete_item_btn.pack(side=LEFT, padx=5)
 
         self.load_combos()
         self.new_order()
 
     def load_combos(self):
-        try:
-            customers = Customer.get_all()
-            self.customer_combo['values'] = [f"{c['customer_id']} - {c['name']}" for c in customers]
-            if customers:
-                self.customer_combo.current(0)
-
-            employees = Employee.get_all()
-            self.employee_combo['values'] = [f"{e['employee_id']} - {e['name']}" for e in employees]
-            if employees:
-                self.employee_combo.current(0)
-
-            medicines = Medicine.get_all()
-            self.medicine_combo['values'] = [f"{m['medicine_id']} - {m['name']}" for m in medicines]
-            if medicines:
-                self.medicine_combo.current(0)
-
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load data: {str(e)}")
+        run_async(self.frame, self.fetch_combos(), on_done=self.show_combos,
+                  on_error=lambda e: messagebox.showerror("Error", f"Failed to load data: {str(e)}"))
+
+    async def fetch_combos(self):
+        # The three lists load side by side, each on its own pooled connection
+        return await asyncio.gather(AsyncProxy(Customer).get_all(columns=["customer_id", "name"]),
+                                    AsyncProxy(Employee).get_all(columns=["employee_id", "name"]),
+                                    AsyncProxy(Medicine).get_all(columns=["medicine_id", "name"]))
+
+    def show_combos(self, combos):
+        customers, employees, medicines = combos
+        self.customer_combo['values'] = [f"{c['customer_id']} - {c['name']}" for c in customers]
+        if customers:
+            self.customer_combo.current(0)
+
+        self.employee_combo['values'] = [f"{e['employee_id']} - {e['name']}" for e in employees]
+        if employees:
+            self.employee_combo.current(0)
+
+        self.medicine_combo['values'] = [f"{m['medicine_id']} - {m['name']}" for m in medicines]
+        if medicines:
+            self.medicine_combo.current(0)
+
+    def set_editing(self, enabled):
+        """Enable or disable the buttons that change the order"""
+        for button in (self.add_item_btn, self.new_order_btn, self.save_btn, self.delete_item_btn):
+            button.config(state=NORMAL if enabled else DISABLED)
+
+    def run_edit(self, fn, *args, on_done, on_error):
+        """Run an add-item lookup or checkout with the order locked, so only one is ever in flight"""
+        self.set_editing(False)
+        self.pending_task = self.runner.submit(fn, *args, on_done=on_done, on_error=on_error,
+                                               on_finally=self.end_edit)
+
+    def end_edit(self):
+        self.pending_task = None
+        self.set_editing(True)
 
     def new_order(self):
         self.order_items = []
@@ -111,6 +140,8 @@ class OrderManager:
         self.total_label.config(text="Total: $0.00")
 
     def add_item(self):
+        if self.pending_task is not None:
+            return
         medicine = self.medicine_combo.get()
         quantity = self.quantity_entry.get()
         if not medicine or not quantity:
@@ -119,26 +150,32 @@ class OrderManager:
         try:
             medicine_id = int(medicine.split(" - ")[0])
             quantity = int(quantity)
-            med = Medicine.get_by_id(medicine_id)
-            if not med:
-                messagebox.showerror("Error", "Medicine not found")
-                return
-            if quantity > med['quantity']:
-                messagebox.showerror("Error", f"Only {med['quantity']} available in stock")
-                return
-            price = float(med['price'])
-            self.order_items.append({
-                'medicine_id': medicine_id,
-                'name': med['name'],
-                'quantity': quantity,
-                'price': price,
-                'subtotal': price * quantity
-            })
-            self.update_items_tree()
-            self.medicine_combo.set('')
-            self.quantity_entry.delete(0, tk.END)
         except Exception as e:
             messagebox.showerror("Error", f"Invalid input: {str(e)}")
+            return
+        self.run_edit(lambda: Medicine.get_by_id(medicine_id, columns=["medicine_id", "name", "quantity", "price"],
+                                                 fresh=True),
+                      on_done=lambda med: self.add_loaded_item(med, quantity),
+                      on_error=lambda e: messagebox.showerror("Error", f"Invalid input: {str(e)}"))
+
+    def add_loaded_item(self, med, quantity):
+        if not med:
+            messagebox.showerror("Error", "Medicine not found")
+            return
+        if quantity > med['quantity']:
+            messagebox.showerror("Error", f"Only {med['quantity']} available in stock")
+            return
+        price = float(med['price'])
+        self.order_items.append({
+            'medicine_id': med['medicine_id'],
+            'name': med['name'],
+            'quantity': quantity,
+            'price': price,
+            'subtotal': price * quantity
+        })
+        self.update_items_tree()
+        self.medicine_combo.set('')
+        self.quantity_entry.delete(0, tk.END)
 
     def update_items_tree(self):
         self.items_tree.delete(*self.items_tree.get_children())
@@ -149,6 +186,8 @@ class OrderManager:
         self.total_label.config(text=f"Total: ${total:.2f}")
 
     def delete_item(self):
+        if self.pending_task is not None:
+            return
         selected = self.items_tree.selection()
         if selected:
             index = self.items_tree.index(selected[0])
@@ -157,6 +196,8 @@ class OrderManager:
                 self.update_items_tree()
 
     def save_order(self):
+        if self.pending_task is not None:
+            return
         if not self.order_items:
             messagebox.showwarning("Warning", "No items in order")
             return
@@ -165,7 +206,6 @@ class OrderManager:
         if not customer or not employee:
             messagebox.showwarning("Warning", "Fill customer and employee fields")
             return
-        conn = None
         try:
             customer_id = int(customer.split(" - ")[0])
             employee_id = int(employee.split(" - ")[0])
@@ -176,31 +216,31 @@ class OrderManager:
                 'total_amount': sum(i['subtotal'] for i in self.order_items),
                 'order_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
-            conn = Database.get_connection()
-            order_id = Order.create_with_details(order_data, self.order_items)
-            if not order_id:
-                raise Exception("Order creation failed")
-            for item in self.order_items:
-                Medicine.reduce_stock(item['medicine_id'], item['quantity'])
-            Customer.add_loyalty_points(customer_id, int(order_data['total_amount'] * 10))
-            conn.commit()
-            messagebox.showinfo("Success", f"Order #{order_id} saved!")
-            self.new_order()
-            if self.on_order_saved:
-                self.on_order_saved()
         except Exception as e:
-            if conn:
-                conn.rollback()
             messagebox.showerror("Error", str(e))
-        finally:
-            if conn:
-                Database.close_connection(conn)
+            return
+        self.run_edit(Order.checkout, order_data, list(self.order_items), int(order_data['total_amount'] * 10),
+                      on_done=self.show_saved, on_error=lambda e: messagebox.showerror("Error", str(e)))
+
+    def show_saved(self, order_id):
+        if not order_id:
+            messagebox.showerror("Error", "Order creation failed")
+            return
+        messagebox.showinfo("Success", f"Order #{order_id} saved!")
+        self.new_order()
+        if self.on_order_saved:
+            self.on_order_saved()
 
     def generate_bill(self):
         if not self.order_items:
             messagebox.showwarning("Warning", "No items to generate bill")
             return
 
+        self.runner.submit(self.print_receipt, list(self.order_items), on_done=self.show_printed,
+                           on_error=lambda e: messagebox.showerror("Error", f"Failed to generate bill: {str(e)}"))
+
+    def print_receipt(self, order_items):
+        """Render the receipt image and send it to the printer; returns (path, printing error or None)"""
         folder = os.path.join(os.getcwd(), "printer")
         os.makedirs(folder, exist_ok=True)
 
@@ -221,11 +261,11 @@ class OrderManager:
         draw.line((50, 80, 550, 80), fill=(0, 0, 0), width=2)
 
         y = 100
-        for item in self.order_items:
+        for item in order_items:
             draw.text((50, y), f"{item['name']} x{item['quantity']}  -  ${item['subtotal']:.2f}", fill=(0, 0, 0), font=font)
             y += 30
 
-        total = sum(i['subtotal'] for i in self.order_items)
+        total = sum(i['subtotal'] for i in order_items)
         draw.line((50, y, 550, y), fill=(0, 0, 0), width=2)
         draw.text((50, y+10), f"Total: ${total:.2f}", fill=(0, 0, 0), font=font_bold)
 
@@ -234,6 +274,13 @@ class OrderManager:
         # Try to print
         try:
             os.startfile(receipt_path, "print")
-            messagebox.showinfo("Printed", f"Receipt saved and sent to printer!\n{receipt_path}")
         except Exception as e:
-            messagebox.showwarning("Print Failed", f"Saved but printing failed: {str(e)}")
+            return receipt_path, e
+        return receipt_path, None
+
+    def show_printed(self, printed):
+        receipt_path, error = printed
+        if error is None:
+            messagebox.showinfo("Printed", f"Receipt saved and sent to printer!\n{receipt_path}")
+        else:
+            messagebox.showwarning("Print Failed", f"Saved but printing failed: {str(error)}")
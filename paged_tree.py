@@ -0,0 +1,103 @@
+from task_runner import TaskRunner, current_task
+
+
+class PagedTreeLoader:
+    """Fill a VirtualTree one page at a time, fetching the next page as the user scrolls near the end.
+
+    fetch_page(cursor) must return (rows, next_cursor) like BaseModel.get_page.
+    It runs as a TaskRunner task, so it must not read widgets; the view is
+    updated on the Tk thread when a page arrives. Rows loaded so far are the
+    view's rows (self.rows).
+    """
+
+    def __init__(self, view, fetch_page, on_error=None, runner=None):
+        self.view = view
+        self.on_error = on_error
+        self.fetch_page = fetch_page
+        self.runner = runner or TaskRunner(view.tree)
+        self.cursor = None
+        self.has_more = False
+        self._task = None
+        view.on_scroll_end = self.load_next
+
+    @property
+    def rows(self):
+        return self.view.rows
+
+    @property
+    def loading(self) -> bool:
+        return self._task is not None
+
+    def cancel(self):
+        """Drop the page loads in flight, e.g. before showing other rows in the view"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def reset(self):
+        """Reload from the first page, re-reading the pages up to the visible and selected rows so the view keeps its place."""
+        wanted = max(self.view.first + self.view.visible, (self.view.selected or 0) + 1)
+        self.cancel()
+        self.has_more = False
+        self._task = self.runner.submit(self._fetch_pages, self.fetch_page, wanted,
+                                        on_done=self._show_pages, on_error=self._reset_failed)
+
+    def restart(self):
+        """Reload from the first page and show it from the top, e.g. after the sort order changed."""
+        self.cancel()
+        self.has_more = False
+        self._task = self.runner.submit(self.fetch_page, None, on_done=self._show_restarted,
+                                        on_error=self._reset_failed)
+
+    def _show_restarted(self, page):
+        self._task = None
+        rows, self.cursor = page
+        self.has_more = self.cursor is not None
+        self.view.set_rows(rows)
+
+    @staticmethod
+    def _fetch_pages(fetch_page, wanted):
+        rows, cursor = [], None
+        while True:
+            current_task().check()
+            page, cursor = fetch_page(cursor)
+            rows.extend(page)
+            if cursor is None or len(rows) >= wanted:
+                return rows, cursor
+
+    def _show_pages(self, page):
+        self._task = None
+        self.show_first_page(page)
+
+    def _reset_failed(self, error):
+        self._task = None
+        self.view.set_rows([])
+        self._report(error)
+
+    def show_first_page(self, page):
+        """Reconcile the view with a first page (rows, next_cursor) fetched elsewhere, e.g. by a search."""
+        self.cancel()
+        rows, self.cursor = page
+        self.has_more = self.cursor is not None
+        self.view.reconcile(rows)
+
+    def load_next(self):
+        if not self.has_more or self._task is not None:
+            return
+        self._task = self.runner.submit(self.fetch_page, self.cursor, on_done=self._append, on_error=self._next_failed)
+
+    def _append(self, page):
+        self._task = None
+        rows, self.cursor = page
+        self.has_more = self.cursor is not None
+        self.view.extend(rows)
+
+    def _next_failed(self, error):
+        self._task = None
+        self.has_more = False
+        self._report(error)
+
+    def _report(self, error):
+        if not self.on_error:
+            raise error
+        self.on_error(error)
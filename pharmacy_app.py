@@ -1,6 +1,9 @@
 import ttkbootstrap as ttkb
 from ttkbootstrap.constants import *
-from tkinter import messagebox
+from tkinter import messagebox, filedialog
+import tkinter as tk
+import os
+import time
 
 from medicine_manager import MedicineManager
 from supplier_manager import SupplierManager
@@ -9,10 +12,23 @@ from order_manager import OrderManager
 from prescription_manager import PrescriptionManager
 from employee_manager import EmployeeManager
 from database import Database
-from data_analysis import AnalysisApp
 from main_screen import MainScreen
 
 class PharmacyApp:
+    # Screens are built on first navigation; the rest are pre-built one at a time while the app is idle
+    MANAGER_CLASSES = {
+        "medicines": MedicineManager,
+        "suppliers": SupplierManager,
+        "customers": CustomerManager,
+        "orders": OrderManager,
+        "prescriptions": PrescriptionManager,
+        "employees": EmployeeManager,
+    }
+    PREFETCH_ORDER = ("medicines", "customers", "prescriptions", "orders", "suppliers", "employees")
+    PREFETCH_DELAY_MS = 1500
+    # How long to wait for the startup warmup to create the pool before giving up
+    POOL_WAIT_TIMEOUT = 30
+
     def __init__(self, root, main_app):
         self.root = root
         self.main_app = main_app
@@ -21,7 +37,14 @@ class PharmacyApp:
         self.root.geometry("1200x800")
 
         try:
-            Database.initialize_pool()
+            warmup = getattr(self.main_app, "warmup", None)
+            if warmup is None:
+                Database.initialize_pool()
+            elif not warmup.wait(self.POOL_WAIT_TIMEOUT):
+                if not warmup.pool_done.is_set():
+                    # A second pool here would be replaced when the warmup's one arrives
+                    raise Exception("Timed out connecting to the database")
+                Database.initialize_pool()
         except Exception as e:
             messagebox.showerror("Database Error", str(e))
             self.root.destroy()
@@ -40,18 +63,21 @@ class PharmacyApp:
         self.content_frame = ttkb.Frame(self.main_frame, padding=10, bootstyle="light")
         self.content_frame.pack(side=RIGHT, fill=BOTH, expand=True)
 
-        # Managers
-        self.managers = {
-            "medicines": MedicineManager(self.content_frame),
-            "suppliers": SupplierManager(self.content_frame),
-            "customers": CustomerManager(self.content_frame),
-            "orders": OrderManager(self.content_frame),
-            "prescriptions": PrescriptionManager(self.content_frame),
-            "employees": EmployeeManager(self.content_frame)
-        }
+        # Managers, built by manager() when first needed
+        self.managers = {}
+        self._prefetch_after = None
+        self._last_input = time.monotonic()
+        # Any key, click or mouse movement restarts the idle time the prefetch waits for
+        for sequence in ("<Key>", "<Button>", "<Motion>", "<MouseWheel>"):
+            self.root.bind(sequence, self.on_user_input, add="+")
 
         self.main_screen = MainScreen(self.content_frame, self)
         self.main_screen.frame.pack(fill=BOTH, expand=True)
+        self.schedule_prefetch()
+
+        # F12 shows per-statement query timings; set PHARMACY_QUERY_STATS_FILE to dump them on exit
+        self.root.bind("<F12>", lambda e: self.show_query_stats())
+        self.root.bind("<Destroy>", self.on_destroy, add="+")
 
     def create_styles(self):
         """Create fixed styles."""
@@ -147,6 +173,35 @@ class PharmacyApp:
 
         self.root.after(200, lambda: self.root.attributes("-alpha", 1.0))
 
+    def manager(self, name):
+        """The manager screen for name, built on first use."""
+        manager = self.managers.get(name)
+        if manager is None:
+            manager = self.managers[name] = self.MANAGER_CLASSES[name](self.content_frame)
+        return manager
+
+    def on_user_input(self, event=None):
+        self._last_input = time.monotonic()
+
+    def schedule_prefetch(self, delay_ms=None):
+        """Pre-build the next likely screen once the user has not touched the UI for PREFETCH_DELAY_MS."""
+        if self._prefetch_after is not None:
+            self.root.after_cancel(self._prefetch_after)
+        self._prefetch_after = self.root.after(delay_ms or self.PREFETCH_DELAY_MS, self.prefetch_next)
+
+    def prefetch_next(self):
+        self._prefetch_after = None
+        # Input events only stamp the time; the timer re-arms for what is left of the idle delay
+        idle_ms = (time.monotonic() - self._last_input) * 1000
+        if idle_ms < self.PREFETCH_DELAY_MS:
+            self.schedule_prefetch(int(self.PREFETCH_DELAY_MS - idle_ms) + 1)
+            return
+        pending = [name for name in self.PREFETCH_ORDER if name not in self.managers]
+        if not pending:
+            return
+        # Widgets can only be built on the Tk thread, so build one screen per idle slot
+        self.root.after_idle(lambda: (self.manager(pending[0]), self.schedule_prefetch()))
+
     def navigate(self, target):
         """Navigate to sections."""
         for widget in self.content_frame.winfo_children():
@@ -154,8 +209,9 @@ class PharmacyApp:
 
         if target == "home":
             self.main_screen.frame.pack(fill=BOTH, expand=True)
-        elif target in self.managers:
-            self.managers[target].frame.pack(fill=BOTH, expand=True)
+        elif target in self.MANAGER_CLASSES:
+            self.manager(target).frame.pack(fill=BOTH, expand=True)
+            self.schedule_prefetch()
         elif target == "analysis":
             self.open_analysis()
 
@@ -181,7 +237,46 @@ class PharmacyApp:
     def show_manager(self, manager_name):
         self.navigate(manager_name)
 
+    def show_query_stats(self):
+        """Show the query timing report in a read-only window."""
+        window = ttkb.Toplevel(self.root)
+        window.title("Query Statistics")
+        window.geometry("1100x500")
+        text = tk.Text(window, wrap="none", font=("Courier", 9))
+        text.pack(fill=BOTH, expand=True)
+        text.insert(END, Database.query_report() or "No queries recorded yet.")
+        text.config(state=DISABLED)
+        ttkb.Button(window, text="💾 Save JSON", bootstyle="secondary-outline",
+                    command=self.save_query_stats).pack(pady=5)
+
+    def save_query_stats(self):
+        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON files", "*.json")])
+        if path:
+            try:
+                Database.dump_query_stats(path)
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to save query stats: {str(e)}")
+
+    def on_destroy(self, event):
+        if event.widget is not self.root:
+            return
+        path = os.environ.get("PHARMACY_QUERY_STATS_FILE")
+        if path:
+            try:
+                Database.dump_query_stats(path)
+            except Exception:
+                pass
+
     def open_analysis(self):
-        """Open analysis window."""
+        """Open analysis window; the pandas/matplotlib stack is only imported the first time."""
+        self.root.config(cursor="watch")
+        self.root.update_idletasks()
+        try:
+            from data_analysis import AnalysisApp
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load analysis: {str(e)}")
+            return
+        finally:
+            self.root.config(cursor="")
         analysis_window = ttkb.Toplevel(self.root)
         AnalysisApp(analysis_window)
@@ -2,17 +2,21 @@ import ttkbootstrap as ttkb
 from ttkbootstrap.constants import *
 from tkinter import messagebox, filedialog
 from datetime import datetime
-from database import Prescription, Customer
+from database import Prescription, Customer, QuerySpec
 from dialog import CommonDialog
+from paged_tree import PagedTreeLoader
+from virtual_tree import VirtualTree
+from table_sorter import PageSorter
+from search_controller import SearchController
+from task_runner import TaskRunner
 import csv
 
 class PrescriptionManager:
+    LIST_COLUMNS = ["prescription_id", "doctor_name", "doctor_license", "issue_date", "expiry_date", "notes"]
+
     def __init__(self, parent_frame):
         self.frame = ttkb.Frame(parent_frame, padding=10, bootstyle="light")
         self.current_prescription = None
-        self.selected_row = None
-        self.sort_column = None
-        self.sort_reverse = False
         self.setup_ui()
 
     def setup_ui(self):
@@ -23,7 +27,6 @@ class PrescriptionManager:
         ttkb.Label(search_frame, text="🔍 Search:", font=("Helvetica", 13, "bold")).pack(side=LEFT)
         self.search_entry = ttkb.Entry(search_frame, width=30)
         self.search_entry.pack(side=LEFT, padx=5)
-        self.search_entry.bind("<KeyRelease>", self.search_prescriptions)
 
         # Treeview
         self.tree = ttkb.Treeview(
@@ -39,10 +42,26 @@ class PrescriptionManager:
             "ID": 50, "Customer": 150, "Doctor": 150, "License": 100,
             "Issue": 100, "Expiry": 100, "Notes": 200
         }.items():
-            self.tree.heading(col, text=col, command=lambda c=col: self.sort_by_column(c))
+            self.tree.heading(col, text=col)
             self.tree.column(col, width=width, anchor=CENTER)
 
-        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.tag_configure("highlighted", background="#0078D7", foreground="white")
+        self.tree.tag_configure("expired", background="#FFECEC", foreground="#C0392B", font=("Helvetica", 10, "bold"))
+        self.view = VirtualTree(self.tree, self.prescription_values, self.prescription_tags,
+                                on_select=self.on_select, selected_tag="highlighted",
+                                key=lambda pres: pres['prescription_id'])
+        self.sorter = PageSorter(self.tree, {
+            "ID": "prescription_id", "Customer": "customer_name", "Doctor": "doctor_name",
+            "License": "doctor_license", "Issue": "issue_date", "Expiry": "expiry_date", "Notes": "notes",
+        }, on_sort=self.reload_sorted)
+        self.search_term = None
+        self.expired_on = None
+        self.filters = {"search_term": None, "where": None}
+        self.runner = TaskRunner(self.frame)
+        self.loader = PagedTreeLoader(self.view, self.fetch_page, on_error=self.show_load_error, runner=self.runner)
+        self.search = SearchController(self.frame, self.fetch_first_page, self.show_first_page,
+                                       on_error=self.show_load_error, runner=self.runner)
+        self.search.attach(self.search_entry, self.begin_search)
         # Doctor Filter
         ttkb.Label(search_frame, text="👨‍⚕️ Doctor:", font=("Helvetica", 11)).pack(side=LEFT, padx=(15, 5))
         self.doctor_filter = ttkb.Combobox(search_frame, state="readonly", width=18)
@@ -77,15 +96,6 @@ class PrescriptionManager:
         
         self.load_prescriptions()
 
-    def highlight_selected_row(self):
-        if self.selected_row:
-            self.tree.item(self.selected_row, tags=())
-        selected = self.tree.selection()
-        if selected:
-            self.selected_row = selected[0]
-            self.tree.item(self.selected_row, tags=("highlighted",))
-            self.tree.tag_configure("highlighted", background="#0078D7", foreground="white")
-            
     def format_date_safe(self, value):
             from datetime import datetime
             if hasattr(value, 'strftime'):
@@ -96,91 +106,95 @@ class PrescriptionManager:
                 return value if isinstance(value, str) else "N/A"
 
     def load_prescriptions(self, search_term=None):
-        """Load and filter prescriptions into the treeview."""
-        self.tree.delete(*self.tree.get_children())
-
-        try:
-            self.prescriptions = Prescription.get_all()
-            filtered = self.prescriptions
-
-            # Apply search term filter if provided
-            if search_term:
-                term = search_term.lower()
-                filtered = []
-                for pres in self.prescriptions:
-                    if (
-                        term in str(pres['prescription_id']).lower()
-                        or term in str(pres.get('doctor_name', '')).lower()
-                        or term in str(pres.get('doctor_license', '')).lower()
-                        or term in str(pres.get('customer_name', '')).lower()
-                        or term in (pres.get('issue_date') or "").strftime("%Y-%m-%d").lower()
-                        or (pres.get('expiry_date') and term in pres['expiry_date'].strftime("%Y-%m-%d").lower())
-                    ):
-                        filtered.append(pres)
-
-            # Fill tree with (possibly filtered) data
-            for pres in filtered:
-                self.tree.insert("", ttkb.END, values=(
-                    pres['prescription_id'],
-                    pres.get('customer_name', "N/A"),
-                    pres.get('doctor_name', "N/A"),
-                    pres.get('doctor_license', "N/A"),
-                    self.format_date_safe(pres.get('issue_date')),
-                    self.format_date_safe(pres.get('expiry_date')),
-                    pres.get('notes', "N/A")
-                ))
-
-            # Populate doctor and customer filters
-            doctor_names = sorted(set(p.get("doctor_name", "N/A") for p in self.prescriptions))
-            customer_names = sorted(set(p.get("customer_name", "N/A") for p in self.prescriptions))
-
-            self.doctor_filter['values'] = ["All"] + doctor_names
-            self.customer_filter['values'] = ["All"] + customer_names
-
-            self.doctor_filter.set("All")
-            self.customer_filter.set("All")
+        """Load the first page of prescriptions into the treeview and reset the filters."""
+        self.search.cancel()
+        self.search_term = search_term or None
+        self.runner.submit(self.fetch_filter_values, on_done=self.show_filter_values, on_error=self.show_load_error)
+
+    def fetch_filter_values(self):
+        return (Prescription.get_distinct("doctor_name", fresh=True),
+                Prescription.get_distinct("customer_name", fresh=True))
+
+    def show_filter_values(self, values):
+        doctors, customers = values
+        self.doctor_filter['values'] = ["All"] + doctors
+        self.customer_filter['values'] = ["All"] + customers
+        self.doctor_filter.set("All")
+        self.customer_filter.set("All")
+        self.reload_list()
+
+    def filter_spec(self):
+        """Doctor/customer filters as a QuerySpec."""
+        spec = QuerySpec()
+        doctor_selected = self.doctor_filter.get()
+        if doctor_selected and doctor_selected != "All":
+            spec.where("doctor_name", "=", doctor_selected)
+        customer_selected = self.customer_filter.get()
+        if customer_selected and customer_selected != "All":
+            spec.where("customer_name", "=", customer_selected)
+        return spec
+
+    def page_filter(self):
+        """Current search box and doctor/customer filters as get_page arguments."""
+        return {"search_term": self.search_term, "where": self.filter_spec().where_clause(Prescription),
+                **self.sorter.page_args()}
+
+    def fetch_page(self, cursor):
+        return Prescription.get_page(cursor, columns=self.LIST_COLUMNS, **self.filters)
+
+    def begin_search(self):
+        """Arguments for a background search on the current search box and filters."""
+        self.search_term = self.search_entry.get() or None
+        self.filters = self.page_filter()
+        return (self.filters,)
+
+    def fetch_first_page(self, filters):
+        return Prescription.get_page(None, columns=self.LIST_COLUMNS, **filters)
+
+    def show_first_page(self, page):
+        self.expired_on = None
+        self.loader.show_first_page(page)
+
+    def reload_list(self):
+        """Leave the expired view, if shown, and reload the first page."""
+        self.expired_on = None
+        self.filters = self.page_filter()
+        self.loader.reset()
+
+    def reload_sorted(self):
+        """Show the first page in the new heading order, leaving the expired view if shown."""
+        self.search.cancel()
+        self.expired_on = None
+        self.filters = self.page_filter()
+        self.loader.restart()
+
+    def prescription_values(self, pres):
+        expiry = self.format_date_safe(pres.get('expiry_date'))
+        if self.expired_on:
+            expiry = f"{expiry} ({(self.expired_on - pres['expiry_date']).days} days ago)"
+        return (
+            pres['prescription_id'],
+            pres.get('customer_name', "N/A"),
+            pres.get('doctor_name', "N/A"),
+            pres.get('doctor_license', "N/A"),
+            self.format_date_safe(pres.get('issue_date')),
+            expiry,
+            pres.get('notes', "N/A")
+        )
 
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load prescriptions: {str(e)}")
-            self.tree.delete(*self.tree.get_children())
-            try:
-                prescriptions = Prescription.get_all()
-                filtered = prescriptions
-
-                if search_term:
-                    term = search_term.lower()
-                    filtered = [
-                        pres for pres in prescriptions
-                        if term in str(pres['prescription_id']).lower()
-                        or term in str(pres.get('doctor_name', '')).lower()
-                        or term in str(pres.get('doctor_license', '')).lower()
-                        or term in str(pres.get('customer_name', '')).lower()
-                        or term in (pres.get('issue_date') or '').strftime("%Y-%m-%d").lower()
-                        or (pres.get('expiry_date') and term in pres['expiry_date'].strftime("%Y-%m-%d").lower())
-                    ]
-
-                for pres in filtered:
-                    self.tree.insert("", ttkb.END, values=(
-                        pres['prescription_id'],
-                        pres.get('customer_name', "N/A"),
-                        pres.get('doctor_name', "N/A"),
-                        pres.get('doctor_license', "N/A"),
-                        pres.get('issue_date').strftime("%Y-%m-%d") if pres.get('issue_date') else "N/A",
-                        pres.get('expiry_date').strftime("%Y-%m-%d") if pres.get('expiry_date') else "N/A",
-                        pres.get('notes', "N/A")
-                    ))
+    def prescription_tags(self, pres):
+        return ("expired",) if self.expired_on else ()
 
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to load prescriptions: {str(e)}")
+    def show_load_error(self, error):
+        messagebox.showerror("Error", f"Failed to load prescriptions: {str(error)}")
 
-    def search_prescriptions(self, event=None):
-        self.load_prescriptions(self.search_entry.get())
+    def after_save(self, message):
+        self.load_prescriptions()
+        messagebox.showinfo("Success", message)
 
-    def on_select(self, event):
-        self.highlight_selected_row()
-        selected = self.tree.selection()
-        if selected:
-            self.current_prescription = self.tree.item(selected[0])['values']
+    def on_select(self, pres):
+        if pres:
+            self.current_prescription = self.view.values(pres)
             self.edit_btn.config(state=NORMAL)
             self.delete_btn.config(state=NORMAL)
         else:
@@ -189,7 +203,10 @@ class PrescriptionManager:
             self.delete_btn.config(state=DISABLED)
 
     def add_prescription(self):
-        customers = Customer.get_all()
+        self.runner.submit(lambda: Customer.get_all(columns=["customer_id", "name"]), on_done=self.show_add_dialog,
+                           on_error=lambda e: messagebox.showerror("Error", f"Failed to add prescription: {str(e)}"))
+
+    def show_add_dialog(self, customers):
         customer_names = [f"{c['customer_id']} - {c['name']}" for c in customers]
 
         fields = [
@@ -214,9 +231,9 @@ class PrescriptionManager:
                     'expiry_date': dialog.result['expiry_date'] or None,
                     'notes': dialog.result['notes'] or None,
                 }
-                Prescription.create(data)
-                self.load_prescriptions()
-                messagebox.showinfo("Success", "Prescription added successfully")
+                self.runner.submit(Prescription.create, data,
+                                   on_done=lambda _: self.after_save("Prescription added successfully"),
+                                   on_error=lambda e: messagebox.showerror("Error", f"Failed to add prescription: {str(e)}"))
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to add prescription: {str(e)}")
 
@@ -225,9 +242,15 @@ class PrescriptionManager:
             return
 
         prescription_id = self.current_prescription[0]
+        self.runner.submit(self.fetch_for_edit, prescription_id, on_done=self.show_edit_dialog,
+                           on_error=lambda e: messagebox.showerror("Error", f"Failed to edit prescription: {str(e)}"))
+
+    def fetch_for_edit(self, prescription_id):
+        return Prescription.get_by_id(prescription_id, fresh=True), Customer.get_all(columns=["customer_id", "name"])
+
+    def show_edit_dialog(self, loaded):
+        presc, customers = loaded
         try:
-            presc = Prescription.get_by_id(prescription_id)
-            customers = Customer.get_all()
             customer_names = [f"{c['customer_id']} - {c['name']}" for c in customers]
             cid_str = next((f"{c['customer_id']} - {c['name']}" for c in customers if c['customer_id'] == presc['customer_id']), "")
 
@@ -261,9 +284,9 @@ class PrescriptionManager:
                     'expiry_date': dialog.result['expiry_date'] or None,
                     'notes': dialog.result['notes'] or None
                 }
-                Prescription.update(prescription_id, updated_data)
-                self.load_prescriptions()
-                messagebox.showinfo("Success", "Prescription updated successfully")
+                self.runner.submit(Prescription.update, presc['prescription_id'], updated_data,
+                                   on_done=lambda _: self.after_save("Prescription updated successfully"),
+                                   on_error=lambda e: messagebox.showerror("Error", f"Failed to edit prescription: {str(e)}"))
 
         except Exception as e:
             messagebox.showerror("Error", f"Failed to edit prescription: {str(e)}")
@@ -273,92 +296,62 @@ class PrescriptionManager:
             return
 
         if messagebox.askyesno("Confirm", "Delete this prescription?", icon="warning"):
-            try:
-                Prescription.delete(self.current_prescription[0])
-                self.load_prescriptions()
-                messagebox.showinfo("Success", "Prescription deleted successfully")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to delete prescription: {str(e)}")
-
-    def sort_by_column(self, col):
-        data = [(self.tree.set(k, col), k) for k in self.tree.get_children("")]
-        data.sort(reverse=self.sort_reverse)
-        for index, (_, k) in enumerate(data):
-            self.tree.move(k, '', index)
-        self.sort_reverse = not self.sort_reverse
-        self.sort_column = col
-
-    
+            self.runner.submit(Prescription.delete, self.current_prescription[0],
+                               on_done=lambda _: self.after_save("Prescription deleted successfully"),
+                               on_error=lambda e: messagebox.showerror("Error", f"Failed to delete prescription: {str(e)}"))
 
     def show_statistics(self):
-        try:
-            total = len(self.tree.get_children())
-            expired = sum(1 for i in self.tree.get_children() if self.tree.item(i)['values'][5] != "N/A" and datetime.strptime(self.tree.item(i)['values'][5], "%Y-%m-%d").date() < datetime.today().date())
-            messagebox.showinfo("Prescription Stats", f"Total: {total}\nExpired: {expired}")
-        except Exception as e:
-            messagebox.showerror("Stats Error", str(e))
-            
-    def filter_prescriptions(self, event=None):
-        doctor_term = self.doctor_filter.get().strip().lower()
-        customer_term = self.customer_filter.get().strip().lower()
-
-        filtered = [
-            p for p in self.prescriptions
-            if doctor_term in p.get("doctor_name", "").lower()
-            and customer_term in p.get("customer_name", "").lower()
-        ]
+        self.runner.submit(self.count_expired, self.page_filter(),
+                           on_done=lambda counts: messagebox.showinfo("Prescription Stats", "Total: %d\nExpired: %d" % counts),
+                           on_error=lambda e: messagebox.showerror("Stats Error", str(e)))
+
+    def count_expired(self, filters):
+        """(total, expired) prescriptions matching the given search and filters."""
+        today = datetime.today().date()
+        total = 0
+        expired = 0
+        for pres in Prescription.iter_pages(columns=["prescription_id", "expiry_date"], **filters):
+            total += 1
+            if pres.get('expiry_date') and pres['expiry_date'] < today:
+                expired += 1
+        return total, expired
 
-        self.tree.delete(*self.tree.get_children())
-
-        for pres in filtered:
-            self.tree.insert("", ttkb.END, values=(
-                pres['prescription_id'],
-                pres.get('customer_name', "N/A"),
-                pres.get('doctor_name', "N/A"),
-                pres.get('doctor_license', "N/A"),
-                pres.get('issue_date').strftime("%Y-%m-%d") if pres.get('issue_date') else "N/A",
-                pres.get('expiry_date').strftime("%Y-%m-%d") if pres.get('expiry_date') else "N/A",
-                pres.get('notes', "N/A")
-            ))
     def apply_filters(self, event=None):
         doctor_selected = self.doctor_filter.get()
         customer_selected = self.customer_filter.get()
 
-        filtered = self.prescriptions
-
-        # تصفية البيانات حسب الطبيب
-        if doctor_selected and doctor_selected != "All":
-            filtered = [p for p in filtered if p.get("doctor_name") == doctor_selected]
-
-        # تصفية البيانات حسب العميل
-        if customer_selected and customer_selected != "All":
-            filtered = [p for p in filtered if p.get("customer_name") == customer_selected]
-
         # تحديث قائمة العملاء أو الأطباء حسب الآخر
         if event and event.widget == self.doctor_filter:
-            customers = sorted(set(p.get("customer_name", "N/A") for p in filtered))
-            self.customer_filter['values'] = ["All"] + customers
-            if self.customer_filter.get() not in customers:
-                self.customer_filter.set("All")
-
+            spec = QuerySpec()
+            if doctor_selected != "All":
+                spec.where("doctor_name", "=", doctor_selected)
+            combo, column = self.customer_filter, "customer_name"
         elif event and event.widget == self.customer_filter:
-            doctors = sorted(set(p.get("doctor_name", "N/A") for p in filtered))
-            self.doctor_filter['values'] = ["All"] + doctors
-            if self.doctor_filter.get() not in doctors:
-                self.doctor_filter.set("All")
+            spec = QuerySpec()
+            if customer_selected != "All":
+                spec.where("customer_name", "=", customer_selected)
+            combo, column = self.doctor_filter, "doctor_name"
+        else:
+            self.search.cancel()
+            self.reload_list()
+            return
+
+        self.search.cancel()
+        self.runner.submit(Prescription.get_distinct, column, spec.where_clause(Prescription),
+                           on_done=lambda values: self.show_filtered(combo, values),
+                           on_error=self.show_filter_error)
 
+    def show_filtered(self, combo, values):
+        """Narrow the other filter to values, then show the results in the table."""
+        combo['values'] = ["All"] + values
+        if combo.get() not in values:
+            combo.set("All")
         # عرض النتائج في الجدول
-        self.tree.delete(*self.tree.get_children())
-        for pres in filtered:
-            self.tree.insert("", ttkb.END, values=(
-                pres['prescription_id'],
-                pres.get('customer_name', "N/A"),
-                pres.get('doctor_name', "N/A"),
-                pres.get('doctor_license', "N/A"),
-                self.format_date_safe(pres.get('issue_date')),
-                self.format_date_safe(pres.get('expiry_date')),
-                pres.get('notes', "N/A")
-            ))
+        self.reload_list()
+
+    def show_filter_error(self, error):
+        messagebox.showerror("Error", f"Failed to load filters: {str(error)}")
+        self.reload_list()
 
     def clear_filters(self):
         """Clear doctor and customer filters and reload data."""
@@ -374,44 +367,34 @@ class PrescriptionManager:
     def show_expired_prescriptions(self):
         from datetime import datetime
 
-        self.tree.delete(*self.tree.get_children())
         today = datetime.today().date()
-        expired = []
+        spec = QuerySpec().where("expiry_date", "<", today).order_by("expiry_date")
+        self.runner.submit(lambda: Prescription.find(spec, fresh=True),
+                           on_done=lambda expired: self.show_expired(expired, today),
+                           on_error=self.show_load_error)
 
+    def show_expired(self, expired, today):
         most_common_doctor = {}
         most_common_customer = {}
 
-        for pres in self.prescriptions:
-            expiry = pres.get("expiry_date")
-            if expiry and isinstance(expiry, datetime) and expiry.date() < today:
-                expired.append(pres)
-
-                # Count doctors and customers
-                doc = pres.get("doctor_name", "N/A")
-                most_common_doctor[doc] = most_common_doctor.get(doc, 0) + 1
+        for pres in expired:
+            # Count doctors and customers
+            doc = pres.get("doctor_name", "N/A")
+            most_common_doctor[doc] = most_common_doctor.get(doc, 0) + 1
 
-                cust = pres.get("customer_name", "N/A")
-                most_common_customer[cust] = most_common_customer.get(cust, 0) + 1
+            cust = pres.get("customer_name", "N/A")
+            most_common_customer[cust] = most_common_customer.get(cust, 0) + 1
 
         # Sort most frequent doctor/customer
         top_doc = max(most_common_doctor, key=most_common_doctor.get) if most_common_doctor else "N/A"
         top_cust = max(most_common_customer, key=most_common_customer.get) if most_common_customer else "N/A"
 
-        # Insert expired prescriptions with highlight
-        for pres in expired:
-            expired_date = pres['expiry_date'].date()
-            days_ago = (today - expired_date).days
-            self.tree.insert("", ttkb.END, values=(
-                pres['prescription_id'],
-                pres.get('customer_name', "N/A"),
-                pres.get('doctor_name', "N/A"),
-                pres.get('doctor_license', "N/A"),
-                self.format_date_safe(pres.get('issue_date')),
-                f"{self.format_date_safe(pres.get('expiry_date'))} ({days_ago} days ago)",
-                pres.get('notes', "N/A")
-            ), tags=("expired",))
-
-        self.tree.tag_configure("expired", background="#FFECEC", foreground="#C0392B", font=("Helvetica", 10, "bold"))
+        # Show expired prescriptions with highlight; scrolling must not page in active ones
+        self.search.cancel()
+        self.loader.cancel()
+        self.loader.has_more = False
+        self.expired_on = today
+        self.view.set_rows(expired)
 
         # Summary info
         messagebox.showinfo(
@@ -420,69 +403,49 @@ class PrescriptionManager:
             f"Most expired by Doctor: {top_doc}\n"
             f"Most expired for Customer: {top_cust}"
         )
-    def export_expired_csv(self):
-        from datetime import datetime, date
-        expired = [
-            pres for pres in self.prescriptions
-            if pres.get("expiry_date") and isinstance(pres["expiry_date"], (datetime, date)) and pres["expiry_date"] < date.today()
-        ]
-
-        if not expired:
-            messagebox.showinfo("No Expired", "No expired prescriptions found.")
-            return
 
-        file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")], title="Export Expired Prescriptions")
-        if not file_path:
-            return
+    def export_expired_csv(self):
+        from datetime import date
+        spec = QuerySpec().where("expiry_date", "<", date.today())
+        self.runner.submit(lambda: Prescription.find(spec, fresh=True),
+                           on_done=lambda expired: self.export_csv(expired, "Expired"),
+                           on_error=lambda e: messagebox.showerror("Export Failed", str(e)))
 
-        try:
-            with open(file_path, "w", newline='', encoding="utf-8") as f:
-                import csv
-                writer = csv.writer(f)
-                writer.writerow(["ID", "Customer", "Doctor", "License", "Issue", "Expiry", "Notes"])
-                for pres in expired:
-                    writer.writerow([
-                        pres['prescription_id'],
-                        pres.get('customer_name', "N/A"),
-                        pres.get('doctor_name', "N/A"),
-                        pres.get('doctor_license', "N/A"),
-                        self.format_date_safe(pres.get('issue_date')),
-                        self.format_date_safe(pres.get('expiry_date')),
-                        pres.get('notes', "N/A")
-                    ])
-            messagebox.showinfo("Exported", f"Expired prescriptions saved to:\n{file_path}")
-        except Exception as e:
-            messagebox.showerror("Export Failed", str(e))
     def export_active_csv(self):
-        from datetime import datetime, date
-        active = [
-            pres for pres in self.prescriptions
-            if not pres.get("expiry_date") or pres["expiry_date"] >= date.today()
-        ]
-
-        if not active:
-            messagebox.showinfo("No Active", "No active prescriptions found.")
+        self.runner.submit(self.fetch_active,
+                           on_done=lambda active: self.export_csv(active, "Active"),
+                           on_error=lambda e: messagebox.showerror("Export Failed", str(e)))
+
+    def fetch_active(self):
+        from datetime import date
+        return Prescription.find(QuerySpec().where("expiry_date", "IS NULL"), fresh=True) + \
+            Prescription.find(QuerySpec().where("expiry_date", ">=", date.today()), fresh=True)
+
+    def export_csv(self, prescriptions, kind):
+        """Ask for a file and write prescriptions to it in the background; kind is "Expired" or "Active"."""
+        if not prescriptions:
+            messagebox.showinfo(f"No {kind}", f"No {kind.lower()} prescriptions found.")
             return
 
-        file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")], title="Export Active Prescriptions")
+        file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")], title=f"Export {kind} Prescriptions")
         if not file_path:
             return
 
-        try:
-            with open(file_path, "w", newline='', encoding="utf-8") as f:
-                import csv
-                writer = csv.writer(f)
-                writer.writerow(["ID", "Customer", "Doctor", "License", "Issue", "Expiry", "Notes"])
-                for pres in active:
-                    writer.writerow([
-                        pres['prescription_id'],
-                        pres.get('customer_name', "N/A"),
-                        pres.get('doctor_name', "N/A"),
-                        pres.get('doctor_license', "N/A"),
-                        self.format_date_safe(pres.get('issue_date')),
-                        self.format_date_safe(pres.get('expiry_date')),
-                        pres.get('notes', "N/A")
-                    ])
-            messagebox.showinfo("Exported", f"Active prescriptions saved to:\n{file_path}")
-        except Exception as e:
-            messagebox.showerror("Export Failed", str(e))
+        self.runner.submit(self.write_csv, file_path, prescriptions,
+                           on_done=lambda _: messagebox.showinfo("Exported", f"{kind} prescriptions saved to:\n{file_path}"),
+                           on_error=lambda e: messagebox.showerror("Export Failed", str(e)))
+
+    def write_csv(self, file_path, prescriptions):
+        with open(file_path, "w", newline='', encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["ID", "Customer", "Doctor", "License", "Issue", "Expiry", "Notes"])
+            for pres in prescriptions:
+                writer.writerow([
+                    pres['prescription_id'],
+                    pres.get('customer_name', "N/A"),
+                    pres.get('doctor_name', "N/A"),
+                    pres.get('doctor_license', "N/A"),
+                    self.format_date_safe(pres.get('issue_date')),
+                    self.format_date_safe(pres.get('expiry_date')),
+                    pres.get('notes', "N/A")
+                ])
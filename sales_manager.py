@@ -3,7 +3,8 @@ from tkinter import ttk, messagebox, simpledialog
 from datetime import datetime
 from PIL import Image, ImageDraw, ImageFont
 import os
-from database import Database
+from database import Database, ModelCache
+from task_runner import TaskRunner
 
 class SalesManager:
     def __init__(self, parent_frame, connection, medicine_manager):
@@ -11,6 +12,7 @@ class SalesManager:
         self.connection = connection
         self.medicine_manager = medicine_manager
         self.bill_items = []
+        self.runner = TaskRunner(self.frame)
         self.setup_ui()
 
     def setup_ui(self):
@@ -201,15 +203,17 @@ class SalesManager:
         cursor = self.connection.cursor()
         try:
             self.connection.start_transaction()
-            
+
+            Database.insert_many(
+                "sales",
+                ["medicine_id", "quantity", "unit_price", "total_price", "customer_id"],
+                [(medicine_id, quantity, price, total, customer_id)
+                 for medicine_name, quantity, price, total, medicine_id in bill_data],
+                cursor=cursor,
+                expressions={"sale_date": "NOW()"}
+            )
+
             for medicine_name, quantity, price, total, medicine_id in bill_data:
-                cursor.execute(
-                    """INSERT INTO sales 
-                    (medicine_id, quantity, unit_price, total_price, sale_date, customer_id) 
-                    VALUES (%s, %s, %s, %s, NOW(), %s)""",
-                    (medicine_id, quantity, price, total, customer_id)
-                )
-                
                 if not self.medicine_manager.reduce_medicine_quantity(medicine_id, quantity):
                     raise Exception("Failed to update medicine quantity")
             
@@ -221,6 +225,7 @@ class SalesManager:
                 )
             
             self.connection.commit()
+            ModelCache.invalidate("medicines", "customers")
             
             self.generate_receipt_image(
                 [(item[0], item[1], item[2], item[3]) for item in bill_data], 
@@ -241,6 +246,23 @@ class SalesManager:
             cursor.close()
 
     def generate_receipt_image(self, bill_data, total_price, customer_id=None):
+        """Look up the customer on the shared connection, then draw and save the receipt in the background"""
+        customer = None
+        if customer_id:
+            cursor = self.connection.cursor()
+            try:
+                cursor.execute("SELECT name, phone FROM customers WHERE customer_id = %s", (customer_id,))
+                customer = cursor.fetchone()
+            except Exception:
+                pass
+            finally:
+                cursor.close()
+
+        self.runner.submit(self.render_receipt, bill_data, total_price, customer,
+                           on_done=lambda path: messagebox.showinfo("Receipt Saved", f"Receipt saved as:\n{path}"),
+                           on_error=lambda e: messagebox.showerror("Error", f"Failed to save receipt: {str(e)}"))
+
+    def render_receipt(self, bill_data, total_price, customer=None):
         img = Image.new('RGB', (600, 800), color=(255, 255, 255))
         draw = ImageDraw.Draw(img)
     
@@ -262,20 +284,11 @@ class SalesManager:
         draw.text((50, 110), f"Date: {current_datetime}", fill=(0, 0, 0), font=font)
     
         y_offset = 140
-        if customer_id:
-            cursor = self.connection.cursor()
-            try:
-                cursor.execute("SELECT name, phone FROM customers WHERE customer_id = %s", (customer_id,))
-                customer = cursor.fetchone()
-                if customer:
-                    draw.text((50, y_offset), f"Customer: {customer[0]}", fill=(0, 0, 0), font=font)
-                    draw.text((50, y_offset+30), f"Phone: {customer[1]}" if customer[1] else "", 
-                             fill=(0, 0, 0), font=font)
-                    y_offset += 60
-            except Exception:
-                pass
-            finally:
-                cursor.close()
+        if customer:
+            draw.text((50, y_offset), f"Customer: {customer[0]}", fill=(0, 0, 0), font=font)
+            draw.text((50, y_offset+30), f"Phone: {customer[1]}" if customer[1] else "", 
+                     fill=(0, 0, 0), font=font)
+            y_offset += 60
     
         draw.line((50, y_offset, 550, y_offset), fill=(0, 0, 0), width=2)
         y_offset += 20
@@ -326,4 +339,4 @@ class SalesManager:
             
         receipt_path = os.path.join(receipt_dir, f"receipt_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png")
         img.save(receipt_path)
-        messagebox.showinfo("Receipt Saved", f"Receipt saved as:\n{receipt_path}")
\ No newline at end of file
+        return receipt_path
\ No newline at end of file
@@ -0,0 +1,77 @@
+from task_runner import TaskRunner
+
+
+class SearchController:
+    """Debounced type-ahead search that queries off the Tk thread.
+
+    Keystrokes in the attached entry restart a short timer; when it fires,
+    make_args() is called on the Tk thread (so it may read widgets) and
+    query(*args) runs as a TaskRunner task. Only the newest search is rendered:
+    a new search or cancel() cancels the one before, so it is skipped if it
+    has not started and its result is dropped if it has. render(result) and
+    on_error(error) always run on the Tk thread.
+    """
+    DELAY_MS = 250
+
+    def __init__(self, widget, query, render, on_error=None, delay: int = None, runner=None):
+        self.widget = widget
+        self.query = query
+        self.render = render
+        self.on_error = on_error
+        self.delay = self.DELAY_MS if delay is None else delay
+        self.runner = runner or TaskRunner(widget)
+        self.make_args = lambda: ()
+        self.dropped = 0
+        self._entry = None
+        self._last_text = None
+        self._after_id = None
+        self._task = None
+
+    def attach(self, entry, make_args=None):
+        """Search on every edit of entry; make_args() builds the query arguments (default: the entry text)"""
+        self._entry = entry
+        self._last_text = entry.get()
+        self.make_args = make_args or (lambda: (entry.get(),))
+        entry.bind("<KeyRelease>", self.on_key)
+
+    def on_key(self, event=None):
+        # Ignore keys that do not change the text (arrows, shift, ...)
+        text = self._entry.get()
+        if text == self._last_text:
+            return
+        self._last_text = text
+        self.schedule()
+
+    def schedule(self):
+        """Run the search once no further call arrives within the delay"""
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+        self._after_id = self.widget.after(self.delay, self.run)
+
+    def run(self):
+        """Start the search now, superseding any search still in flight"""
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+        args = self.make_args()
+        self._drop_current()
+        self._task = self.runner.submit(self.query, *args, on_done=self.render, on_error=self._on_error)
+
+    def cancel(self):
+        """Drop the pending and in-flight searches, e.g. before a direct reload of the same view"""
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+        self._drop_current()
+        if self._entry is not None:
+            self._last_text = self._entry.get()
+
+    def _drop_current(self):
+        if self._task is not None and not self._task.done:
+            self._task.cancel()
+            self.dropped += 1
+        self._task = None
+
+    def _on_error(self, error):
+        if self.on_error:
+            self.on_error(error)
@@ -0,0 +1,208 @@
+import re
+import threading
+import time
+from heapq import nsmallest
+from typing import Dict, List, Optional
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def normalize(value) -> str:
+    """Lower-case a field value and collapse runs of whitespace"""
+    if value is None:
+        return ""
+    return " ".join(str(value).lower().split())
+
+
+class SearchIndex:
+    """In-memory type-ahead index over a few text columns of one table.
+
+    Every field value posts its trigrams, and every word in it posts its one-
+    and two-character prefixes, so a query of any length is answered from set
+    intersections without a LIKE '%term%' scan. Candidates are checked as real
+    substrings and ranked by match kind (whole field, field prefix, word prefix,
+    anywhere), then by field order (earlier fields first), then by shorter value.
+    A one- or two-character term matches anywhere, like LIKE: word prefixes come
+    from the postings and the rest from a scan of the indexed values, which is
+    skipped when the prefix matches alone fill the limit.
+
+    Indexes register under their table name like ModelCache; models keep them
+    in sync on create/update/delete through add() and remove(), holding
+    lock(table) so that a write cannot slip between a rebuild's table scan and
+    its registration.
+    """
+    _registry = {}
+    _registry_lock = threading.Lock()
+    _table_locks = {}
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.built_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._docs = {}         # id -> tuple of normalized values, one per field
+        self._grams = {}        # trigram -> set of ids
+        self._prefixes = {}     # one/two-character word prefix -> {id: rank}, ranked at index time
+
+    @classmethod
+    def get(cls, table: str) -> Optional["SearchIndex"]:
+        return cls._registry.get(table)
+
+    @classmethod
+    def lock(cls, table: str) -> threading.Lock:
+        """The lock held while table's index is rebuilt, replaced or written to"""
+        with cls._registry_lock:
+            lock = cls._table_locks.get(table)
+            if lock is None:
+                lock = cls._table_locks[table] = threading.Lock()
+            return lock
+
+    @classmethod
+    def build(cls, table: str, fields, rows, id_column: str) -> "SearchIndex":
+        """Index rows (dicts with id_column and the fields) and register the result for table.
+
+        The caller holds lock(table) from before reading rows until this returns.
+        """
+        index = cls(fields)
+        for row in rows:
+            index.add(row[id_column], row)
+        with cls._registry_lock:
+            cls._registry[table] = index
+        return index
+
+    @classmethod
+    def discard(cls, *tables):
+        """Drop the indexes of tables, e.g. after writes they cannot follow; they are rebuilt on next use"""
+        for table in tables:
+            # Waits for a rebuild in progress, which would otherwise register an index older than the write
+            with cls.lock(table), cls._registry_lock:
+                cls._registry.pop(table, None)
+
+    def __len__(self):
+        return len(self._docs)
+
+    def age(self) -> float:
+        return time.monotonic() - self.built_at
+
+    @staticmethod
+    def _keys(values):
+        grams, prefixes = set(), set()
+        for value in values:
+            for i in range(len(value) - 2):
+                grams.add(value[i:i + 3])
+            for word in _WORD.findall(value):
+                prefixes.add(word[:1])
+                prefixes.add(word[:2])
+        return grams, prefixes
+
+    def _post_prefixes(self, prefixes, values, id):
+        for prefix in prefixes:
+            ranks = self._prefixes.get(prefix)
+            if ranks is None:
+                ranks = self._prefixes[prefix] = {}
+            ranks[id] = self._rank(prefix, values)
+
+    @staticmethod
+    def _post(postings: Dict, keys, id):
+        for key in keys:
+            ids = postings.get(key)
+            if ids is None:
+                postings[key] = {id}
+            else:
+                ids.add(id)
+
+    @staticmethod
+    def _unpost(postings: Dict, keys, id):
+        for key in keys:
+            ids = postings.get(key)
+            if ids is not None:
+                if isinstance(ids, dict):
+                    ids.pop(id, None)
+                else:
+                    ids.discard(id)
+                if not ids:
+                    del postings[key]
+
+    def add(self, id, row: Dict):
+        """Index or re-index a row; fields missing from row keep their previously indexed value"""
+        with self._lock:
+            old = self._docs.get(id)
+            values = tuple(
+                normalize(row[field]) if field in row else (old[i] if old else "")
+                for i, field in enumerate(self.fields)
+            )
+            if old == values:
+                return
+            if old is not None:
+                self._remove(id, old)
+            self._docs[id] = values
+            grams, prefixes = self._keys(values)
+            self._post(self._grams, grams, id)
+            self._post_prefixes(prefixes, values, id)
+
+    def remove(self, id):
+        with self._lock:
+            old = self._docs.pop(id, None)
+            if old is not None:
+                self._remove(id, old)
+
+    def _remove(self, id, values):
+        grams, prefixes = self._keys(values)
+        self._unpost(self._grams, grams, id)
+        self._unpost(self._prefixes, prefixes, id)
+
+    def search(self, term: str, limit: int = None) -> List:
+        """Ids of rows matching term, best first; at most limit ids when given"""
+        term = normalize(term)
+        if not term:
+            return []
+        with self._lock:
+            if len(term) < 3:
+                ranks = self._prefixes.get(term, {})
+                scored = [(rank, id) for id, rank in ranks.items()]
+                # Word-prefix matches rank ahead of matches inside a word, so when they fill the
+                # limit the scan is not needed; a term with punctuation is never posted, so it always scans
+                if limit is None or len(scored) < limit or not _WORD.fullmatch(term):
+                    rank = self._rank
+                    scored.extend((r, id) for id, values in self._docs.items() if id not in ranks
+                                  for r in (rank(term, values),) if r is not None)
+            else:
+                posting_lists = []
+                for i in range(len(term) - 2):
+                    ids = self._grams.get(term[i:i + 3])
+                    if not ids:
+                        return []
+                    posting_lists.append(ids)
+                posting_lists.sort(key=len)
+                candidates = posting_lists[0].intersection(*posting_lists[1:])
+                docs, rank = self._docs, self._rank
+                scored = [(r, id) for id in candidates for r in (rank(term, docs[id]),) if r is not None]
+        if limit is not None:
+            scored = nsmallest(limit, scored)
+        else:
+            scored.sort()
+        return [id for _, id in scored]
+
+    @staticmethod
+    def _rank(term: str, values):
+        """Sort key of the best match of term in values (lower is better), or None.
+
+        Packed into one int (kind, field position, value length) because millions
+        of them are kept in the prefix postings and ints cost the GC nothing.
+        """
+        best = None
+        for position, value in enumerate(values):
+            at = value.find(term)
+            if at < 0:
+                continue
+            if value == term:
+                kind = 0
+            elif at == 0:
+                kind = 1
+            elif not value[at - 1].isalnum() or value.find(" " + term) >= 0:
+                kind = 2
+            else:
+                kind = 3
+            rank = (kind << 24) | (position << 16) | min(len(value), 0xFFFF)
+            if best is None or rank < best:
+                best = rank
+        return best
@@ -0,0 +1,59 @@
+import threading
+
+from database import BaseModel, Database, Employee, Medicine, Supplier
+
+
+class StartupWarmup:
+    """Connect to the database and read the reference lists while the login form is open.
+
+    start() runs, on a daemon thread: pool creation, opening the pool's
+    connections, and the lookups the manager screens make when they are built
+    (supplier, employee and medicine id/name lists, medicine categories). The
+    lookups go through the models' read-through caches, kept there for
+    CACHE_TTL seconds, so a screen built after login gets them from there
+    without a round trip.
+
+    wait() blocks only until the pool has been created, not for the rest of
+    the warmup, and returns True if it is ready; the error from a failed pool
+    creation is kept in self.error. A failed lookup is ignored, the screen
+    just queries again.
+    """
+    REFERENCE_LISTS = (
+        lambda: Supplier.get_all(columns=["supplier_id", "name"]),
+        lambda: Employee.get_all(columns=["employee_id", "name"]),
+        lambda: Medicine.get_all(columns=["medicine_id", "name"]),
+        lambda: Medicine.get_distinct("category"),
+    )
+    # Longer than Medicine's own 30 s so the lists survive a slow login
+    CACHE_TTL = 300
+
+    def __init__(self):
+        self.error = None
+        self.pool_done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="startup-warmup", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def wait(self, timeout: float = None) -> bool:
+        return self.pool_done.wait(timeout) and self.error is None
+
+    def _run(self):
+        try:
+            Database.initialize_pool()
+        except Exception as e:
+            self.error = e
+            return
+        finally:
+            self.pool_done.set()
+        try:
+            Database.warm_pool()
+        except Exception:
+            pass
+        with BaseModel.cache_ttl(self.CACHE_TTL):
+            for load in self.REFERENCE_LISTS:
+                try:
+                    load()
+                except Exception:
+                    pass
@@ -1,10 +1,15 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from database import Stock, Medicine, Database
+from search_controller import SearchController
+from virtual_tree import VirtualTree
+from task_runner import TaskRunner
 
 class StockManager:
     def __init__(self, parent_frame):
         self.frame = ttk.Frame(parent_frame)
+        self.runner = TaskRunner(self.frame)
+        self.load_task = None
         self.setup_ui()
 
     def setup_ui(self):
@@ -32,7 +37,9 @@ class StockManager:
         ttk.Label(filter_frame, text="Search:").pack(side="left")
         self.search_entry = ttk.Entry(filter_frame, width=30)
         self.search_entry.pack(side="left", padx=5)
-        self.search_entry.bind("<KeyRelease>", self.search_stock)
+        self.search = SearchController(self.frame, self.fetch_stock, self.show_stock, on_error=self.show_load_error,
+                                       runner=self.runner)
+        self.search.attach(self.search_entry, self.begin_search)
         
         # Stock treeview
         self.stock_tree = ttk.Treeview(stock_frame, columns=(
@@ -51,7 +58,8 @@ class StockManager:
             self.stock_tree.column(col_id, width=width, anchor="center")
         
         self.stock_tree.pack(fill="both", expand=True)
-        self.stock_tree.bind("<<TreeviewSelect>>", self.on_stock_select)
+        self.stock_view = VirtualTree(self.stock_tree, self.stock_values, on_select=self.on_stock_select,
+                                      key=lambda item: item['stock_id'])
         
         # Update frame
         update_frame = ttk.Frame(stock_frame)
@@ -73,94 +81,112 @@ class StockManager:
         self.load_stock()
 
     def load_low_stock(self):
+        self.runner.submit(Stock.check_low_stock, on_done=self.show_low_stock,
+                           on_error=lambda e: messagebox.showerror("Error", f"Failed to load low stock alerts: {str(e)}"))
+
+    def show_low_stock(self, low_stock):
         for row in self.alert_tree.get_children():
             self.alert_tree.delete(row)
-        
-        try:
-            low_stock = Stock.check_low_stock()
-            for item in low_stock:
-                self.alert_tree.insert("", "end", values=(
-                    item['name'],
-                    item['quantity_in_stock'],
-                    item['reorder_level']
-                ))
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load low stock alerts: {str(e)}")
 
-    def load_stock(self, search_term=None):
-        for row in self.stock_tree.get_children():
-            self.stock_tree.delete(row)
-        
-        query = """SELECT m.name, s.quantity_in_stock, s.reorder_level, s.last_updated 
+        for item in low_stock:
+            self.alert_tree.insert("", "end", values=(
+                item['name'],
+                item['quantity_in_stock'],
+                item['reorder_level']
+            ))
+
+    def fetch_stock(self, search_term=None):
+        # stock_id keys the rows in the view; medicine names need not be unique
+        query = """SELECT s.stock_id, m.name, s.quantity_in_stock, s.reorder_level, s.last_updated 
                   FROM stock s JOIN medicines m ON s.medicine_id = m.medicine_id"""
         
         if search_term:
             query += " WHERE m.name LIKE %s"
-            try:
-                stock_items = Database.execute_query(query, (f"%{search_term}%",), fetch=True)
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to load stock: {str(e)}")
-                return
-        else:
-            try:
-                stock_items = Database.execute_query(query, fetch=True)
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to load stock: {str(e)}")
-                return
-        
-        for item in stock_items:
-            self.stock_tree.insert("", "end", values=(
-                item['name'],
-                item['quantity_in_stock'],
-                item['reorder_level'],
-                item['last_updated'].strftime("%Y-%m-%d") if item['last_updated'] else "N/A"
-            ))
+            return Database.execute_query(query, (f"%{search_term}%",), fetch=True)
+        return Database.execute_query(query, fetch=True)
+
+    def begin_search(self):
+        """Arguments for a search; a reload still in flight would render over its result, so it is dropped"""
+        self.cancel_load()
+        return (self.search_entry.get(),)
 
-    def search_stock(self, event=None):
-        self.load_stock(self.search_entry.get())
+    def cancel_load(self):
+        if self.load_task is not None:
+            self.load_task.cancel()
+            self.load_task = None
 
-    def on_stock_select(self, event):
-        selected = self.stock_tree.selection()
-        if selected:
-            values = self.stock_tree.item(selected[0])['values']
+    def load_stock(self, search_term=None):
+        self.search.cancel()
+        self.cancel_load()
+        self.load_task = self.runner.submit(self.fetch_stock, search_term, on_done=self.show_loaded,
+                                            on_error=self.show_load_error)
+
+    def show_load_error(self, error):
+        messagebox.showerror("Error", f"Failed to load stock: {str(error)}")
+
+    def show_loaded(self, stock_items):
+        self.load_task = None
+        self.show_stock(stock_items)
+
+    def show_stock(self, stock_items):
+        self.stock_view.reconcile(stock_items)
+
+    def stock_values(self, item):
+        return (
+            item['name'],
+            item['quantity_in_stock'],
+            item['reorder_level'],
+            item['last_updated'].strftime("%Y-%m-%d") if item['last_updated'] else "N/A"
+        )
+
+    def on_stock_select(self, item):
+        if item:
+            values = self.stock_view.values(item)
             self.qty_entry.delete(0, tk.END)
             self.qty_entry.insert(0, str(values[1]))
             self.reorder_entry.delete(0, tk.END)
             self.reorder_entry.insert(0, str(values[2]))
 
     def update_stock(self):
-        selected = self.stock_tree.selection()
+        selected = self.stock_view.selected_row()
         if not selected:
             return
         
-        medicine_name = self.stock_tree.item(selected[0])['values'][0]
+        medicine_name = selected['name']
         new_qty = self.qty_entry.get()
         new_reorder = self.reorder_entry.get()
         
         try:
             new_qty = int(new_qty)
             new_reorder = int(new_reorder)
-            
-            # Get medicine ID
-            med = next((m for m in Medicine.get_all() if m['name'] == medicine_name), None)
-            if not med:
-                messagebox.showerror("Error", "Medicine not found")
-                return
-            
-            # Update stock
-            try:
-                Database.execute_query(
-                    """UPDATE stock SET quantity_in_stock = %s, 
-                      reorder_level = %s, last_updated = CURRENT_DATE 
-                      WHERE medicine_id = %s""",
-                    (new_qty, new_reorder, med['medicine_id'])
-                )
-                
-                messagebox.showinfo("Success", "Stock updated successfully")
-                self.load_low_stock()
-                self.load_stock()
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to update stock: {str(e)}")
-            
         except ValueError:
-            messagebox.showerror("Error", "Please enter valid numbers for quantity and reorder level")  
\ No newline at end of file
+            messagebox.showerror("Error", "Please enter valid numbers for quantity and reorder level")
+            return
+
+        self.runner.submit(self.save_stock, medicine_name, new_qty, new_reorder, on_done=self.show_saved,
+                           on_error=lambda e: messagebox.showerror("Error", f"Failed to update stock: {str(e)}"))
+
+    def save_stock(self, medicine_name, new_qty, new_reorder):
+        """Update the stock row of a medicine by name; False if there is no such medicine"""
+        # Get medicine ID
+        med = next((m for m in Medicine.get_all(columns=["medicine_id", "name"], fresh=True)
+                    if m['name'] == medicine_name), None)
+        if not med:
+            return False
+
+        # Update stock
+        Database.execute_query(
+            """UPDATE stock SET quantity_in_stock = %s, 
+              reorder_level = %s, last_updated = CURRENT_DATE 
+              WHERE medicine_id = %s""",
+            (new_qty, new_reorder, med['medicine_id'])
+        )
+        return True
+
+    def show_saved(self, found):
+        if not found:
+            messagebox.showerror("Error", "Medicine not found")
+            return
+        messagebox.showinfo("Success", "Stock updated successfully")
+        self.load_low_stock()
+        self.load_stock()
\ No newline at end of file
@@ -2,16 +2,23 @@ import ttkbootstrap as ttkb
 from ttkbootstrap.constants import *
 from tkinter import messagebox, filedialog
 import csv
-from database import Supplier
+from database import Supplier, QuerySpec
 from dialog import CommonDialog  # مهم جدا جدا
+from search_controller import SearchController
+from task_runner import TaskRunner
+from virtual_tree import VirtualTree
 
 class SupplierManager:
+    LIST_COLUMNS = ["supplier_id", "name", "contact_person", "phone", "email", "country", "payment_terms"]
+    # Treeview heading -> column, in the same order as LIST_COLUMNS
+    HEADING_COLUMNS = dict(zip(("ID", "Name", "Contact", "Phone", "Email", "Country", "Terms"), LIST_COLUMNS))
+
     def __init__(self, parent_frame):
         self.frame = ttkb.Frame(parent_frame, padding=10, bootstyle="light")
         self.current_supplier = None
-        self.selected_row = None
         self.sort_column = None
         self.sort_reverse = False
+        self.load_task = None
         self.setup_ui()
 
     def setup_ui(self):
@@ -21,7 +28,10 @@ class SupplierManager:
         ttkb.Label(search_frame, text="🔍 Search:", font=("Helvetica", 13, "bold")).pack(side=LEFT)
         self.search_entry = ttkb.Entry(search_frame, width=30, font=("Helvetica", 11))
         self.search_entry.pack(side=LEFT, padx=5)
-        self.search_entry.bind("<KeyRelease>", self.search_suppliers)
+        self.runner = TaskRunner(self.frame)
+        self.search = SearchController(self.frame, Supplier.find, self.show_suppliers, on_error=self.show_load_error,
+                                       runner=self.runner)
+        self.search.attach(self.search_entry, self.begin_search)
 
         self.tree = ttkb.Treeview(
             self.frame,
@@ -46,7 +56,9 @@ class SupplierManager:
             self.tree.heading(col, text=col, command=lambda c=col: self.sort_by_column(c))
             self.tree.column(col, width=width, anchor=CENTER)
 
-        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.tag_configure("highlighted", background="#0078D7", foreground="white")
+        self.view = VirtualTree(self.tree, self.supplier_values, on_select=self.on_select,
+                                selected_tag="highlighted", key=lambda sup: sup['supplier_id'])
 
         btn_frame = ttkb.Frame(self.frame, padding=(0,5))
         btn_frame.pack(fill=X, padx=10, pady=10)
@@ -54,7 +66,7 @@ class SupplierManager:
         ttkb.Label(search_frame, text="🌍 Country:", font=("Helvetica", 13, "bold")).pack(side=LEFT, padx=(15, 5))
         self.country_combo = ttkb.Combobox(search_frame, font=("Helvetica", 10), width=20, state="readonly")
         self.country_combo.pack(side=LEFT)
-        self.country_combo.bind("<<ComboboxSelected>>", lambda e: self.load_suppliers())
+        self.country_combo.bind("<<ComboboxSelected>>", lambda e: self.load_suppliers(self.search_entry.get()))
 
         ttkb.Button(btn_frame, text="➕ Add", command=self.add_supplier, bootstyle="success-outline", width=14, padding=(10,6)).pack(side=LEFT, padx=5)
         self.edit_btn = ttkb.Button(btn_frame, text="✏️ Edit", command=self.edit_supplier, bootstyle="info-outline", width=14, padding=(10,6), state=DISABLED)
@@ -67,79 +79,68 @@ class SupplierManager:
         ttkb.Button(btn_frame, text="📊 Stats", command=self.show_supplier_statistics, bootstyle="secondary-outline", width=14, padding=(10,6)).pack(side=LEFT, padx=5)
         self.load_suppliers()
 
-    def highlight_selected_row(self):
-        if self.selected_row:
-            self.tree.item(self.selected_row, tags=())
-
-        selected = self.tree.selection()
-        if selected:
-            self.selected_row = selected[0]
-            self.tree.item(self.selected_row, tags=("highlighted",))
-            self.tree.tag_configure("highlighted", background="#0078D7", foreground="white")
+    def query_spec(self, search_term=None):
+        """Search box, country filter and heading sort as a QuerySpec"""
+        spec = QuerySpec(columns=self.LIST_COLUMNS)
+        spec.match(search_term)
+        selected_country = self.country_combo.get()
+        if selected_country and selected_country != "All":
+            spec.where("country", "=", selected_country)
+        if self.sort_column:
+            spec.order_by(self.HEADING_COLUMNS[self.sort_column], self.sort_reverse)
+        return spec
+
+    def begin_search(self):
+        """Arguments for a search; a reload still in flight would render over its result, so it is dropped"""
+        self.cancel_load()
+        return (self.query_spec(self.search_entry.get()),)
+
+    def cancel_load(self):
+        if self.load_task is not None:
+            self.load_task.cancel()
+            self.load_task = None
 
     def load_suppliers(self, search_term=None):
-        self.tree.delete(*self.tree.get_children())
-
-        try:
-            self.suppliers = Supplier.get_all()
-            filtered_suppliers = self.suppliers
-
-            if search_term:
-                term = search_term.lower()
-                filtered_suppliers = [
-                    sup for sup in filtered_suppliers
-                    if term in str(sup.get('name', '')).lower()
-                    or term in str(sup.get('contact_person', '')).lower()
-                    or term in str(sup.get('phone', '')).lower()
-                    or term in str(sup.get('email', '')).lower()
-                    or term in str(sup.get('country', '')).lower()
-                    or term in str(sup.get('payment_terms', '')).lower()
-                ]
-
-            selected_country = self.country_combo.get()
-            if selected_country and selected_country != "All":
-                filtered_suppliers = [
-                    sup for sup in filtered_suppliers if sup.get('country') == selected_country
-                ]
-
-            for sup in filtered_suppliers:
-                self.tree.insert("", ttkb.END, values=(
-                    sup['supplier_id'],
-                    sup['name'],
-                    sup.get('contact_person', "N/A"),
-                    sup.get('phone', "N/A"),
-                    sup.get('email', "N/A"),
-                    sup.get('country', "N/A"),
-                    sup.get('payment_terms', "N/A")
-                ))
-
-            # Populate country filter combobox once
-            countries = list({sup.get('country') for sup in self.suppliers if sup.get('country')})
-            self.country_combo['values'] = ["All"] + sorted(countries)
-            if not self.country_combo.get():
-                self.country_combo.set("All")
-
-            # Update supplier count label (if exists)
-            count = len(filtered_suppliers)
-            if hasattr(self, 'count_label'):
-                self.count_label.config(text=f"Total: {count} suppliers")
-
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to load suppliers: {str(e)}")
-
-
-    def search_suppliers(self, event=None):
-        self.load_suppliers(self.search_entry.get())
-
-    def sort_by_column(self, col):
-        data = [(self.tree.set(k, col), k) for k in self.tree.get_children("")]
-        data.sort(reverse=self.sort_reverse)
-
-        for index, (val, k) in enumerate(data):
-            self.tree.move(k, '', index)
+        self.search.cancel()
+        self.cancel_load()
+        # Searches reuse the country list from the last full reload
+        with_countries = not search_term or not self.country_combo['values']
+        self.load_task = self.runner.submit(self.fetch_suppliers, self.query_spec(search_term), with_countries,
+                                            on_done=self.show_loaded, on_error=self.show_load_error)
+
+    def fetch_suppliers(self, spec, with_countries):
+        countries = Supplier.get_distinct("country", fresh=True) if with_countries else None
+        return countries, Supplier.find(spec, fresh=True)
+
+    def show_loaded(self, loaded):
+        countries, suppliers = loaded
+        self.load_task = None
+        if countries is not None:
+            self.country_combo['values'] = ["All"] + countries
+        if not self.country_combo.get():
+            self.country_combo.set("All")
+        self.show_suppliers(suppliers)
+
+    def show_suppliers(self, suppliers):
+        self.view.reconcile(suppliers)
+
+        # Update supplier count label (if exists)
+        if hasattr(self, 'count_label'):
+            self.count_label.config(text=f"Total: {len(suppliers)} suppliers")
+
+    def supplier_values(self, sup):
+        return (
+            sup['supplier_id'],
+            sup['name'],
+            sup.get('contact_person', "N/A"),
+            sup.get('phone', "N/A"),
+            sup.get('email', "N/A"),
+            sup.get('country', "N/A"),
+            sup.get('payment_terms', "N/A")
+        )
 
-        self.sort_reverse = not self.sort_reverse
-        self.sort_column = col
+    def show_load_error(self, error):
+        messagebox.showerror("Error", f"Failed to load suppliers: {str(error)}")
 
     def export_to_csv(self):
         file_path = filedialog.asksaveasfilename(
@@ -150,21 +151,23 @@ class SupplierManager:
         if not file_path:
             return
 
-        try:
-            with open(file_path, "w", newline='', encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(["ID", "Name", "Contact Person", "Phone", "Email", "Country", "Payment Terms"])
-                for item in self.tree.get_children():
-                    writer.writerow(self.tree.item(item)['values'])
-            messagebox.showinfo("Success", f"Suppliers exported successfully to:\n{file_path}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to export suppliers: {str(e)}")
-
-    def on_select(self, event):
-        self.highlight_selected_row()
-        selected = self.tree.selection()
-        if selected:
-            self.current_supplier = self.tree.item(selected[0])['values']
+        self.runner.submit(self.write_csv, file_path, self.view.displayed(),
+                           on_done=lambda _: messagebox.showinfo("Success", f"Suppliers exported successfully to:\n{file_path}"),
+                           on_error=lambda e: messagebox.showerror("Error", f"Failed to export suppliers: {str(e)}"))
+
+    def write_csv(self, file_path, rows):
+        with open(file_path, "w", newline='', encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["ID", "Name", "Contact Person", "Phone", "Email", "Country", "Payment Terms"])
+            writer.writerows(rows)
+
+    def after_save(self, message):
+        self.load_suppliers()
+        messagebox.showinfo("Success", message)
+
+    def on_select(self, sup):
+        if sup:
+            self.current_supplier = self.view.values(sup)
             self.edit_btn.config(state=NORMAL)
             self.delete_btn.config(state=NORMAL)
         else:
@@ -184,12 +187,9 @@ class SupplierManager:
 
         dialog = CommonDialog(self.frame, "Add Supplier", fields, align_right_labels=True)
         if dialog.result:
-            try:
-                Supplier.create(dialog.result)
-                self.load_suppliers()
-                messagebox.showinfo("Success", "Supplier added successfully")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to add supplier: {str(e)}")
+            self.runner.submit(Supplier.create, dialog.result,
+                               on_done=lambda _: self.after_save("Supplier added successfully"),
+                               on_error=lambda e: messagebox.showerror("Error", f"Failed to add supplier: {str(e)}"))
 
     def edit_supplier(self):
         if not self.current_supplier:
@@ -216,24 +216,18 @@ class SupplierManager:
 
         dialog = CommonDialog(self.frame, "Edit Supplier", fields, initial_data=supplier_data, align_right_labels=True)
         if dialog.result:
-            try:
-                Supplier.update(supplier_id, dialog.result)
-                self.load_suppliers()
-                messagebox.showinfo("Success", "Supplier updated successfully")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to update supplier: {str(e)}")
+            self.runner.submit(Supplier.update, supplier_id, dialog.result,
+                               on_done=lambda _: self.after_save("Supplier updated successfully"),
+                               on_error=lambda e: messagebox.showerror("Error", f"Failed to update supplier: {str(e)}"))
 
     def delete_supplier(self):
             if not self.current_supplier:
                 return
 
             if messagebox.askyesno("Confirm Deletion", "Are you sure you want to delete this supplier?", icon="warning"):
-                try:
-                    Supplier.delete(self.current_supplier[0])
-                    self.load_suppliers()
-                    messagebox.showinfo("Success", "Supplier deleted successfully")
-                except Exception as e:
-                    messagebox.showerror("Error", f"Failed to delete supplier: {str(e)}")
+                self.runner.submit(Supplier.delete, self.current_supplier[0],
+                                   on_done=lambda _: self.after_save("Supplier deleted successfully"),
+                                   on_error=lambda e: messagebox.showerror("Error", f"Failed to delete supplier: {str(e)}"))
                     
     def view_supplier_details(self):
         if not self.current_supplier:
@@ -254,25 +248,26 @@ class SupplierManager:
 
         messagebox.showinfo("Supplier Details", details)
     def show_supplier_statistics(self):
-        try:
-            total = len(self.suppliers)
-            countries = [s.get("country", "Unknown") for s in self.suppliers]
-            unique_countries = set(countries)
-            most_common = max(set(countries), key=countries.count)
-
-            messagebox.showinfo("Supplier Statistics", f"""
+        self.runner.submit(self.supplier_statistics,
+                           on_done=lambda message: messagebox.showinfo("Supplier Statistics", message),
+                           on_error=lambda e: messagebox.showerror("Error", f"Could not calculate statistics: {str(e)}"))
+
+    def supplier_statistics(self):
+        suppliers = Supplier.get_all(columns=["supplier_id", "country"], fresh=True)
+        total = len(suppliers)
+        countries = [s.get("country", "Unknown") for s in suppliers]
+        unique_countries = set(countries)
+        most_common = max(set(countries), key=countries.count)
+
+        return f"""
             📦 Total Suppliers: {total}
             🌍 Unique Countries: {len(unique_countries)}
             🏆 Most Common Country: {most_common}
-            """)
-        except Exception as e:
-            messagebox.showerror("Error", f"Could not calculate statistics: {str(e)}")
+            """
     def sort_by_column(self, col):
-        data = [(self.tree.set(k, col), k) for k in self.tree.get_children("")]
-        data.sort(reverse=self.sort_reverse)
-
-        for index, (val, k) in enumerate(data):
-            self.tree.move(k, '', index)
+        """Reload sorted by a heading in MySQL; clicking the same heading again reverses the order"""
+        self.sort_reverse = not self.sort_reverse if col == self.sort_column else False
+        self.sort_column = col
 
         # تحديث عنوان العمود لإظهار رمز السهم 🔽 أو 🔼
         arrow = " 🔽" if self.sort_reverse else " 🔼"
@@ -282,7 +277,6 @@ class SupplierManager:
                 col_text += arrow
             self.tree.heading(heading, text=col_text, command=lambda c=heading: self.sort_by_column(c))
 
-        self.sort_reverse = not self.sort_reverse
-        self.sort_column = col
+        self.load_suppliers(self.search_entry.get())
 
 
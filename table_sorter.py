@@ -0,0 +1,110 @@
+class TableSorter:
+    """Typed, stable, multi-column heading sort for a VirtualTree.
+
+    keys maps tree columns to functions of the source row that return the
+    value to sort on (numbers, dates or the text()/field() helpers below), so
+    nothing is parsed back out of the displayed strings. None sorts last in
+    either direction. Sorting on a column makes it the primary key and keeps
+    the previous ones as tie-breakers, up to MAX_COLUMNS; the order is then
+    kept by the view as rows are reloaded or paged in.
+    """
+    MAX_COLUMNS = 3
+    ARROWS = (" 🔼", " 🔽")
+
+    def __init__(self, view, keys, bind_headings=True):
+        self.view = view
+        self.keys = keys
+        self.columns = []       # (column, reverse), primary first
+        self._sort_keys = {}    # (column, reverse) -> key function
+        self._labels = {column: view.tree.heading(column)["text"] for column in keys}
+        if bind_headings:
+            for column in keys:
+                view.tree.heading(column, command=lambda c=column: self.sort(c))
+
+    def sort(self, column, reverse=None):
+        """Sort on column; by default a second click on the primary column reverses it"""
+        if reverse is None:
+            reverse = bool(self.columns) and self.columns[0] == (column, False)
+        others = [(c, r) for c, r in self.columns if c != column]
+        self.columns = [(column, reverse)] + others[:self.MAX_COLUMNS - 1]
+        self.view.order_by(*((self._sort_key(c, r), r) for c, r in self.columns))
+        self._show_arrows()
+
+    def clear(self):
+        """Back to the order the rows are loaded in"""
+        self.columns = []
+        self.view.order_by()
+        self._show_arrows()
+
+    def _sort_key(self, column, reverse):
+        sort_key = self._sort_keys.get((column, reverse))
+        if sort_key is None:
+            value = self.keys[column]
+            # Rows with no value go last: (False, v) sorts before (True, None), and the other way round when reversed
+            if reverse:
+                def sort_key(row):
+                    v = value(row)
+                    return (v is not None, v)
+            else:
+                def sort_key(row):
+                    v = value(row)
+                    return (v is None, v)
+            self._sort_keys[(column, reverse)] = sort_key
+        return sort_key
+
+    def _show_arrows(self):
+        primary = self.columns[0] if self.columns else (None, False)
+        for column, label in self._labels.items():
+            arrow = self.ARROWS[primary[1]] if column == primary[0] else ""
+            self.view.tree.heading(column, text=label + arrow)
+
+
+class PageSorter:
+    """Single-column heading sort for paged screens, done by get_page in MySQL.
+
+    A TableSorter only orders the rows loaded so far, which on a
+    PagedTreeLoader screen is the first pages of the unsorted list. Here
+    columns maps tree columns to result columns of the model, and a click
+    calls on_sort() so the screen reloads from the first page with
+    page_args() passed on to get_page.
+    """
+    ARROWS = TableSorter.ARROWS
+
+    def __init__(self, tree, columns, on_sort):
+        self.tree = tree
+        self.columns = columns
+        self.on_sort = on_sort
+        self.column = None
+        self.descending = False
+        self._labels = {column: tree.heading(column)["text"] for column in columns}
+        for column in columns:
+            tree.heading(column, command=lambda c=column: self.sort(c))
+
+    def sort(self, column, descending=None):
+        """Sort on column; by default a second click on it reverses the order"""
+        if descending is None:
+            descending = column == self.column and not self.descending
+        self.column, self.descending = column, descending
+        for heading, label in self._labels.items():
+            arrow = self.ARROWS[descending] if heading == column else ""
+            self.tree.heading(heading, text=label + arrow)
+        self.on_sort()
+
+    def page_args(self):
+        """sort_column/descending arguments for get_page"""
+        if self.column is None:
+            return {}
+        return {"sort_column": self.columns[self.column], "descending": self.descending}
+
+
+def field(name):
+    """Sort on a row value as it comes from the database"""
+    return lambda row: row.get(name)
+
+
+def text(name):
+    """Case-insensitive sort on a text value"""
+    def key(row):
+        value = row.get(name)
+        return None if value is None else str(value).casefold()
+    return key
@@ -0,0 +1,150 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Fewer workers than the pool's pool_size, so the Tk thread still gets a
+# connection without waiting while every worker holds one
+MAX_WORKERS = 4
+
+_executor = None
+_executor_lock = threading.Lock()
+_local = threading.local()
+
+
+def executor() -> ThreadPoolExecutor:
+    """The thread pool shared by every TaskRunner"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="task")
+        return _executor
+
+
+class TaskCancelled(Exception):
+    """Raised by Task.check() once the task was cancelled"""
+
+
+class Task:
+    """A function submitted to a TaskRunner, and its cancellation token.
+
+    Code running in the task gets it from current_task() to report progress
+    and to stop early: check() raises TaskCancelled after cancel().
+    """
+
+    def __init__(self, runner=None, on_done=None, on_error=None, on_progress=None, on_finally=None):
+        self.runner = runner
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.on_finally = on_finally
+        self.done = False
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Skip the task if it has not started, and drop its result or error if it has"""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def check(self):
+        if self._cancelled.is_set():
+            raise TaskCancelled()
+
+    def progress(self, message):
+        """Report progress; on_progress(message) is called on the Tk thread"""
+        if self.runner is not None and self.on_progress is not None and not self.cancelled:
+            self.runner._messages.put((self, self.on_progress, message, False))
+
+
+_NO_TASK = Task()
+
+
+def current_task() -> Task:
+    """The task running on this thread; outside a task, one that is never cancelled and reports nowhere"""
+    return getattr(_local, "task", None) or _NO_TASK
+
+
+class TaskRunner:
+    """Run functions on a shared thread pool and hand their outcome back to the Tk thread.
+
+    submit(fn, *args) calls fn(*args) on a worker and returns its Task. Tk
+    must not be called from the workers, so the callbacks are queued and run
+    on the Tk thread by a short after() poll: on_done(result) or
+    on_error(error) (the runner's on_error if none is given), on_progress(message)
+    for each progress report, and then on_finally(). A cancelled task skips
+    on_done and on_error, but on_finally still runs, e.g. to re-enable a button.
+
+    submit() and cancel_all() must be called on the Tk thread.
+    """
+    POLL_MS = 20
+
+    def __init__(self, widget, on_error=None):
+        self.widget = widget
+        self.on_error = on_error
+        self.tasks = set()
+        self._messages = queue.Queue()
+        self._polling = False
+
+    def submit(self, fn, *args, on_done=None, on_error=None, on_progress=None, on_finally=None) -> Task:
+        task = Task(self, on_done, on_error or self.on_error, on_progress, on_finally)
+        self.tasks.add(task)
+        executor().submit(self._work, task, fn, args)
+        if not self._polling:
+            self._polling = True
+            self.widget.after(self.POLL_MS, self._poll)
+        return task
+
+    def cancel_all(self):
+        for task in self.tasks:
+            task.cancel()
+
+    @property
+    def busy(self) -> bool:
+        return bool(self.tasks)
+
+    def _work(self, task, fn, args):
+        callback = value = None
+        if not task.cancelled:
+            _local.task = task
+            try:
+                callback, value = task.on_done, fn(*args)
+            except TaskCancelled:
+                pass
+            except Exception as e:
+                callback, value = task.on_error, e
+            finally:
+                _local.task = None
+        self._messages.put((task, callback, value, True))
+
+    def _poll(self):
+        while True:
+            try:
+                task, callback, value, finished = self._messages.get_nowait()
+            except queue.Empty:
+                break
+            if finished:
+                task.done = True
+                self.tasks.discard(task)
+            if not task.cancelled:
+                if callback is not None:
+                    self._call(callback, value)
+                elif finished and isinstance(value, Exception):
+                    self._report(value)
+            if finished and task.on_finally is not None:
+                self._call(task.on_finally)
+        if self.tasks:
+            self.widget.after(self.POLL_MS, self._poll)
+        else:
+            self._polling = False
+
+    def _call(self, callback, *args):
+        try:
+            callback(*args)
+        except Exception as e:
+            self._report(e)
+
+    def _report(self, error):
+        # Same handling as an exception in any other Tk callback
+        self.widget._root().report_callback_exception(type(error), error, error.__traceback__)
@@ -0,0 +1,139 @@
+import threading
+import time
+
+import pytest
+
+import database
+from database import ConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+    in_transaction = False
+
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def connect(monkeypatch):
+    opened = []
+
+    def fake_connect(**kwargs):
+        conn = FakeConnection(len(opened))
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(database.mysql.connector, "connect", fake_connect)
+    return opened
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_waiters_are_served_in_arrival_order(connect):
+    pool = ConnectionPool(pool_size=1, max_overflow=0, timeout=5)
+    held = pool.get_connection()
+    served = []
+
+    def checkout(name):
+        conn = pool.get_connection()
+        served.append(name)
+        conn.close()
+
+    threads = []
+    for number, name in enumerate(("first", "second", "third"), 1):
+        thread = threading.Thread(target=checkout, args=(name,))
+        thread.start()
+        threads.append(thread)
+        # Each caller is queued before the next one starts
+        wait_until(lambda: pool.stats()["waiting"] == number)
+
+    held.close()
+    for thread in threads:
+        thread.join(2)
+    assert served == ["first", "second", "third"]
+    assert len(connect) == 1
+    stats = pool.stats()
+    assert stats["waits"] == 3 and stats["in_use"] == 0 and stats["idle"] == 1
+
+
+def test_overflow_connections_are_closed_on_release(connect):
+    pool = ConnectionPool(pool_size=1, max_overflow=1, timeout=5)
+    first = pool.get_connection()
+    overflow = pool.get_connection()
+    assert pool.stats()["opened"] == 2
+
+    overflow.close()
+    assert connect[1].closed
+    first.close()
+    assert not connect[0].closed
+    stats = pool.stats()
+    assert stats["opened"] == 1 and stats["idle"] == 1 and stats["in_use"] == 0
+
+
+def test_checkout_times_out_when_pool_and_overflow_are_in_use(connect):
+    pool = ConnectionPool(pool_size=1, max_overflow=1, timeout=5)
+    pool.get_connection()
+    pool.get_connection()
+    with pytest.raises(PoolTimeoutError):
+        pool.get_connection(timeout=0.05)
+    stats = pool.stats()
+    assert stats["timeouts"] == 1 and stats["waiting"] == 0
+
+
+def test_discard_lets_a_waiter_open_a_new_connection(connect):
+    pool = ConnectionPool(pool_size=1, max_overflow=0, timeout=5)
+    held = pool.get_connection()
+    got = []
+    thread = threading.Thread(target=lambda: got.append(pool.get_connection()))
+    thread.start()
+    wait_until(lambda: pool.stats()["waiting"] == 1)
+
+    held.invalidate()
+    thread.join(2)
+    assert connect[0].closed
+    assert len(connect) == 2 and got[0]._conn is connect[1]
+
+
+def test_connections_in_use_are_closed_when_returned_to_a_closed_pool(connect):
+    pool = ConnectionPool(pool_size=2, max_overflow=0, timeout=5)
+    idle = pool.get_connection()
+    in_use = pool.get_connection()
+    idle.close()
+
+    pool.close_all()
+    assert connect[0].closed and not connect[1].closed
+    in_use.close()
+    assert connect[1].closed
+    assert pool.stats()["opened"] == 0
+
+
+def test_concurrent_first_uses_share_one_pool(connect, monkeypatch):
+    monkeypatch.setattr(database.Database, "_Database__connection_pool", None)
+    monkeypatch.setattr(database.SchemaRegistry, "load", classmethod(lambda cls: None))
+    built = []
+    real_pool = database.ConnectionPool
+
+    def counting_pool(*args, **kwargs):
+        built.append(1)
+        time.sleep(0.05)
+        return real_pool(*args, **kwargs)
+
+    monkeypatch.setattr(database, "ConnectionPool", counting_pool)
+    threads = [threading.Thread(target=lambda: database.Database.get_connection().close()) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(2)
+    assert len(built) == 1
@@ -0,0 +1,16 @@
+from database import Customer, Medicine
+
+
+def test_medicine_delete_reaches_every_table_referencing_it():
+    assert set(Medicine.cascade_tables()) == {"stock", "prescription_items", "order_items"}
+    statements = Medicine._cascade_statements(2)
+    assert "DELETE FROM order_items WHERE medicine_id IN (%s, %s)" in statements
+    assert statements[-1] == "DELETE FROM medicines WHERE medicine_id IN (%s, %s)"
+
+
+def test_nested_dependents_are_deleted_before_their_parents():
+    statements = Customer._cascade_statements(1)
+    assert statements.index(
+        "DELETE FROM order_items WHERE order_id IN (SELECT order_id FROM orders WHERE customer_id IN (%s))"
+    ) < statements.index("DELETE FROM orders WHERE customer_id IN (%s)")
+    assert statements[-1] == "DELETE FROM customers WHERE customer_id IN (%s)"
@@ -0,0 +1,78 @@
+import sqlite3
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+import database
+from database import BaseModel
+
+
+class Item(BaseModel):
+    TABLE = "items"
+    PRIMARY_KEY = "item_id"
+    COLUMNS = ("item_id", "name", "price")
+
+
+ROWS = [(1, "b", 5), (2, None, 3), (3, "a", None), (4, "b", 1), (5, None, None), (6, "c", 3), (7, "a", 2)]
+
+
+@pytest.fixture
+def db(monkeypatch):
+    # SQLite orders NULLs like MySQL (first ascending, last descending) and has row values
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.execute("CREATE TABLE items (item_id INTEGER PRIMARY KEY, name TEXT, price INTEGER)")
+    conn.executemany("INSERT INTO items VALUES (?, ?, ?)", ROWS)
+
+    def fetch_all(query, params=()):
+        return [dict(row) for row in conn.execute(query.replace("%s", "?"), params)]
+
+    monkeypatch.setattr(database.Database, "fetch_all", staticmethod(fetch_all))
+    return conn
+
+
+def all_pages(**page_args):
+    rows, cursor, pages = [], None, 0
+    while True:
+        page, cursor = Item.get_page(cursor, page_size=2, **page_args)
+        rows.extend(row["item_id"] for row in page)
+        pages += 1
+        if cursor is None:
+            return rows, pages
+
+
+@pytest.mark.parametrize("sort_column", [None, "name", "price"])
+@pytest.mark.parametrize("descending", [False, True])
+def test_pages_follow_the_full_order(db, sort_column, descending):
+    direction = " DESC" if descending else ""
+    order = f"{sort_column}{direction}, item_id{direction}" if sort_column else f"item_id{direction}"
+    expected = [row["item_id"] for row in db.execute(f"SELECT item_id FROM items ORDER BY {order}")]
+    rows, pages = all_pages(sort_column=sort_column, descending=descending)
+    assert rows == expected
+    assert pages == 4
+
+
+def test_pages_keep_the_where_filter(db):
+    rows, _ = all_pages(sort_column="price", where=("name IS NOT NULL", ()))
+    assert rows == [3, 4, 7, 6, 1]
+
+
+@pytest.mark.parametrize("key", [
+    [1],
+    ["text", 2],
+    [None, 3],
+    [Decimal("12.50"), 4],
+    [date(2024, 2, 29), 5],
+    [datetime(2024, 2, 29, 13, 45, 7, 120), 6],
+    [2.5, 7],
+])
+def test_cursor_round_trip_keeps_types(key):
+    decoded = Item._decode_cursor(Item._encode_cursor(key))
+    assert decoded == key
+    assert [type(value) for value in decoded] == [type(value) for value in key]
+
+
+def test_cursor_rejects_values_it_cannot_restore():
+    with pytest.raises(TypeError):
+        Item._encode_cursor([{"not": "a key"}, 1])
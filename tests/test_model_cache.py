@@ -0,0 +1,99 @@
+import types
+
+import pytest
+
+import database
+from database import BaseModel, ModelCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(database, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    monkeypatch.setattr(ModelCache, "_registry", {})
+
+
+class Thing(BaseModel):
+    TABLE = "things"
+    CACHE_TTL = 30
+    CACHE_SIZE = 8
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = ModelCache("things", max_size=4, ttl=30)
+    cache.put("k", 1)
+    clock[0] += 29
+    assert cache.get("k") == 1
+    clock[0] += 2
+    assert cache.get("k") is ModelCache._MISSING
+
+
+def test_put_ttl_overrides_cache_ttl(clock):
+    cache = ModelCache("things", max_size=4, ttl=30)
+    cache.put("k", 1, ttl=300)
+    clock[0] += 299
+    assert cache.get("k") == 1
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = ModelCache("things", max_size=2, ttl=30)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is ModelCache._MISSING
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate_clears_caches_that_depend_on_the_table(clock):
+    orders = ModelCache.for_model(type("Order", (), {"TABLE": "orders", "CACHE_SIZE": 4, "CACHE_TTL": 30,
+                                                    "CACHE_DEPENDS": ("customers",)}))
+    medicines = ModelCache.for_model(type("Medicine", (), {"TABLE": "medicines", "CACHE_SIZE": 4, "CACHE_TTL": 30,
+                                                          "CACHE_DEPENDS": ()}))
+    orders.put("k", 1)
+    medicines.put("k", 2)
+    ModelCache.invalidate("customers")
+    assert orders.get("k") is ModelCache._MISSING
+    assert medicines.get("k") == 2
+
+
+def test_put_from_before_a_clear_is_dropped(clock):
+    cache = ModelCache("things", max_size=4, ttl=30)
+    generation = cache.generation
+    cache.clear()
+    cache.put("k", "stale", generation)
+    assert cache.get("k") is ModelCache._MISSING
+    assert cache.stats()["stale_puts"] == 1
+
+
+def test_cached_reads_once_and_hands_out_copies(clock):
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return [{"id": 1}]
+
+    rows = Thing._cached("key", loader)
+    rows[0]["id"] = 99
+    assert Thing._cached("key", loader) == [{"id": 1}]
+    assert len(loads) == 1
+
+
+def test_fresh_read_bypasses_and_replaces_the_cached_value(clock):
+    values = iter([["old"], ["new"]])
+    Thing._cached("key", lambda: next(values))
+    assert Thing._cached("key", lambda: next(values), fresh=True) == ["new"]
+    assert Thing._cached("key", lambda: ["unused"]) == ["new"]
+
+
+def test_cache_ttl_applies_to_reads_inside_it(clock):
+    with BaseModel.cache_ttl(300):
+        Thing._cached("key", lambda: ["warm"])
+    clock[0] += 200
+    assert Thing._cached("key", lambda: ["reloaded"]) == ["warm"]
@@ -0,0 +1,98 @@
+import pytest
+
+import database
+from database import Prescription
+from search_index import SearchIndex
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    monkeypatch.setattr(SearchIndex, "_registry", {})
+    monkeypatch.setattr(SearchIndex, "_table_locks", {})
+
+
+ROWS = [
+    {"id": 1, "name": "Amoxicillin", "batch": "B-100"},
+    {"id": 2, "name": "Paracetamol", "batch": "AMX-7"},
+    {"id": 3, "name": "Amox", "batch": "C-1"},
+    {"id": 4, "name": "Ibuprofen forte", "batch": "F-2"},
+    {"id": 5, "name": "Co-amoxiclav", "batch": "D-9"},
+]
+
+
+def build():
+    return SearchIndex.build("medicines", ("name", "batch"), ROWS, "id")
+
+
+def test_trigram_search_ranks_whole_then_prefix_then_word_then_inside():
+    index = build()
+    # Exact value, value prefix, word prefix, then the match in the later field
+    assert index.search("amox") == [3, 1, 5]
+    assert index.search("AMX") == [2]
+    assert index.search("cetam") == [2]
+    assert index.search("zzz") == []
+
+
+def test_trigram_search_checks_real_substrings():
+    index = build()
+    # "ofe" and "fen" both occur, but not "ofen f" across words in another row
+    assert index.search("ofen f") == [4]
+    assert index.search("amoxil") == []
+
+
+def test_short_terms_match_anywhere_with_word_prefixes_first():
+    index = build()
+    assert index.search("fo") == [4]
+    # "ce" starts no word but is inside Paracetamol, like LIKE '%ce%'
+    assert index.search("ce") == [2]
+    assert index.search("a")[:2] == [3, 1]
+    assert set(index.search("a")) == {1, 2, 3, 5}
+
+
+def test_short_term_limit_prefers_prefix_matches():
+    index = build()
+    assert index.search("am", limit=2) == [3, 1]
+
+
+def test_short_term_with_punctuation_scans_values():
+    index = build()
+    # Both match inside a word, so the shorter value comes first
+    assert index.search("-1") == [3, 1]
+
+
+def test_add_reindexes_and_remove_forgets():
+    index = build()
+    index.add(3, {"name": "Cefalexin"})
+    assert 3 not in index.search("amox")
+    assert index.search("cefa") == [3]
+    # Fields missing from the row keep their indexed value
+    assert index.search("c-1") == [3]
+    index.remove(3)
+    assert index.search("cefa") == []
+    assert len(index) == 4
+
+
+def test_discard_drops_the_registered_index():
+    build()
+    SearchIndex.discard("medicines")
+    assert SearchIndex.get("medicines") is None
+
+
+def test_prescription_rows_get_customer_names_from_one_query(monkeypatch):
+    queries = []
+
+    def fetch_all(query, params=()):
+        queries.append((query, params))
+        return [{"customer_id": 1, "name": "Sara"}, {"customer_id": 2, "name": "Omar"}]
+
+    monkeypatch.setattr(database.Database, "fetch_all", staticmethod(fetch_all))
+    monkeypatch.setattr(database.ModelCache, "_registry", {})
+    index = SearchIndex.build("prescriptions", Prescription.SEARCH_FIELDS, [], "prescription_id")
+    Prescription._index_rows([10, 11, 12], [
+        {"customer_id": 1, "doctor_name": "Dr A"},
+        {"customer_id": 2, "doctor_name": "Dr B"},
+        {"customer_id": 1, "doctor_name": "Dr C"},
+    ])
+    assert len(queries) == 1
+    assert index.search("sara") == [10, 12]
+    assert index.search("omar") == [11]
@@ -0,0 +1,108 @@
+from virtual_tree import VirtualTree
+
+
+class FakeTree:
+    """Just enough of a ttk.Treeview for VirtualTree, recording item writes"""
+
+    def __init__(self, height=3):
+        self.height = height
+        self.items = {}
+        self.writes = 0
+        self._selection = ()
+        self._next = 0
+
+    def cget(self, option):
+        return self.height
+
+    def bind(self, *args, **kwargs):
+        pass
+
+    def configure(self, **kwargs):
+        pass
+
+    def insert(self, parent, index):
+        self._next += 1
+        item = f"I{self._next}"
+        self.items[item] = None
+        return item
+
+    def delete(self, item):
+        del self.items[item]
+
+    def item(self, item, values, tags):
+        self.items[item] = values
+        self.writes += 1
+
+    def selection(self):
+        return self._selection
+
+    def selection_set(self, items):
+        self._selection = tuple(items)
+
+
+class FakeScrollbar:
+    def configure(self, **kwargs):
+        pass
+
+    def set(self, first, last):
+        pass
+
+
+def make_view(rows, height=3):
+    selected = []
+    tree = FakeTree(height)
+    view = VirtualTree(tree, lambda row: (row["id"], row["name"]), on_select=selected.append,
+                       scrollbar=FakeScrollbar(), key=lambda row: row["id"])
+    view.set_rows(rows)
+    return view, tree, selected
+
+
+def rows(*pairs):
+    return [{"id": id, "name": name} for id, name in pairs]
+
+
+def test_reconcile_counts_added_changed_and_removed_rows():
+    view, _, _ = make_view(rows((1, "a"), (2, "b"), (3, "c")))
+    assert view.reconcile(rows((1, "a"), (3, "C"), (4, "d"))) == (1, 1, 1)
+    assert [row["id"] for row in view.rows] == [1, 3, 4]
+
+
+def test_unchanged_rows_keep_their_objects_and_items_are_not_rewritten():
+    view, tree, _ = make_view(rows((1, "a"), (2, "b"), (3, "c")))
+    kept = view.rows[0]
+    writes = tree.writes
+    view.reconcile(rows((1, "a"), (2, "b"), (3, "c")))
+    assert view.rows[0] is kept
+    assert tree.writes == writes
+
+
+def test_selection_follows_its_row_by_key():
+    view, _, selected = make_view(rows((1, "a"), (2, "b"), (3, "c")))
+    view.select(1)
+    selected.clear()
+    view.reconcile(rows((0, "z"), (1, "a"), (2, "b"), (3, "c")))
+    assert view.selected_row()["id"] == 2
+    assert selected == []
+
+
+def test_selection_is_cleared_when_its_row_is_removed():
+    view, _, selected = make_view(rows((1, "a"), (2, "b")))
+    view.select(1)
+    view.reconcile(rows((1, "a")))
+    assert view.selected_row() is None
+    assert selected[-1] is None
+
+
+def test_changed_selected_row_is_reported():
+    view, _, selected = make_view(rows((1, "a"), (2, "b")))
+    view.select(1)
+    view.reconcile(rows((1, "a"), (2, "B")))
+    assert selected[-1] == {"id": 2, "name": "B"}
+
+
+def test_scroll_position_stays_on_the_first_visible_row():
+    view, tree, _ = make_view(rows(*((i, str(i)) for i in range(10))))
+    view.scroll_to(5)
+    view.reconcile(rows(*((i, str(i)) for i in range(-3, 10))))
+    assert view.rows[view.first]["id"] == 5
+    assert sorted(values[0] for values in tree.items.values()) == [5, 6, 7]
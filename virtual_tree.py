@@ -0,0 +1,278 @@
+from tkinter import ttk
+
+
+class VirtualTree:
+    """Show a long list of rows in a Treeview that only holds the visible lines.
+
+    The source rows (e.g. dicts from the models) are kept in self.rows. The
+    tree holds one item per line that fits on screen, and scrolling re-fills
+    those items from format_row(row) -> values and tags_for(row) -> tags, so
+    loading or sorting 200k rows costs a screenful of Tk calls, not 200k.
+
+    Items are reused as the view scrolls, so the selected row is tracked here
+    rather than by the tree: on_select(row) is called with the newly selected
+    row, or None, and selected_tag (if given) is added to its tags.
+
+    With key(row) -> primary key, reconcile() takes a fresh list of the same
+    view and keeps the selection and scroll position on the same rows; only
+    items whose displayed values changed are written to the tree.
+
+    order_by() keeps the rows sorted, also as they are replaced or extended.
+    """
+    SCROLL_UNITS = 3
+
+    def __init__(self, tree, format_row, tags_for=None, on_select=None, selected_tag=None, scrollbar=None,
+                 key=None):
+        self.tree = tree
+        self.format_row = format_row
+        self.key = key
+        self.tags_for = tags_for or (lambda row: ())
+        self.on_select = on_select
+        self.selected_tag = selected_tag
+        self.on_scroll_end = None
+        self.threshold = 0.9
+        self.rows = []
+        self.order = ()
+        self.first = 0
+        self.selected = None
+        self.visible = int(tree.cget("height")) or 10
+        self._height = None
+        self._items = []
+        self._shown = {}    # item -> (values, tags) last written to it
+        if scrollbar is None:
+            scrollbar = ttk.Scrollbar(tree.master, orient="vertical")
+            scrollbar.place(in_=tree, relx=1.0, rely=0, relheight=1.0, anchor="ne")
+        self.scrollbar = scrollbar
+        scrollbar.configure(command=self.yview)
+
+        tree.configure(selectmode="browse")
+        tree.bind("<<TreeviewSelect>>", self._on_tree_select, add="+")
+        tree.bind("<Configure>", self._on_configure, add="+")
+        tree.bind("<MouseWheel>", self._on_wheel)
+        tree.bind("<Button-4>", lambda e: self._scroll_lines(-self.SCROLL_UNITS))
+        tree.bind("<Button-5>", lambda e: self._scroll_lines(self.SCROLL_UNITS))
+        tree.bind("<Up>", lambda e: self._move_selection(-1))
+        tree.bind("<Down>", lambda e: self._move_selection(1))
+        tree.bind("<Prior>", lambda e: self._move_selection(-self.visible))
+        tree.bind("<Next>", lambda e: self._move_selection(self.visible))
+        tree.bind("<Home>", lambda e: self._move_selection(-len(self.rows)))
+        tree.bind("<End>", lambda e: self._move_selection(len(self.rows)))
+
+    # ----- rows -----
+
+    def set_rows(self, rows):
+        """Replace all rows and scroll back to the top"""
+        had_selection = self.selected is not None
+        self.rows = list(rows)
+        self.first = 0
+        self.selected = None
+        self._reorder()
+        self.refresh()
+        if had_selection and self.on_select:
+            self.on_select(None)
+
+    def reconcile(self, rows):
+        """Replace the rows with a reloaded list, keeping selection and scroll position by key.
+
+        Rows equal to the ones they replace keep their old objects. Returns the
+        number of (added, changed, removed) rows.
+        """
+        if self.key is None:
+            self.set_rows(rows)
+            return len(self.rows), 0, 0
+        key = self.key
+        selected = self.selected_row()
+        selected_key = None if selected is None else key(selected)
+        anchor_key = key(self.rows[self.first]) if self.first < len(self.rows) else None
+        old = {key(row): row for row in self.rows}
+
+        merged = []
+        added = changed = 0
+        first = selected_index = None
+        for row in rows:
+            row_key = key(row)
+            previous = old.pop(row_key, None)
+            if previous is None:
+                added += 1
+            elif previous != row:
+                changed += 1
+            else:
+                row = previous
+            if row_key == anchor_key:
+                first = len(merged)
+            if row_key == selected_key:
+                selected_index = len(merged)
+            merged.append(row)
+
+        self.rows = merged
+        if first is not None:
+            self.first = first
+        self.selected = selected_index
+        self._reorder()
+        self.refresh()
+        if self.on_select and selected is not None and (selected_index is None or merged[selected_index] is not selected):
+            self.on_select(self.selected_row())
+        return added, changed, len(old)
+
+    def extend(self, rows):
+        """Append rows, e.g. the next page of a PagedTreeLoader"""
+        self.rows.extend(rows)
+        self._reorder()
+        self.refresh()
+
+    def values(self, row) -> list:
+        """The displayed values of a row, as tree.item(...)['values'] used to give them"""
+        return list(self.format_row(row))
+
+    def displayed(self):
+        """Displayed values of every row in order, e.g. for a CSV export of the current view"""
+        return [self.values(row) for row in self.rows]
+
+    def order_by(self, *order):
+        """Keep the rows sorted on (key, reverse) pairs, most significant first; the selection stays on the same row"""
+        self.order = order
+        self._reorder()
+        self.first = 0
+        if self.selected is not None:
+            self.see(self.selected)
+        self.refresh()
+
+    def _reorder(self):
+        if not self.order or not self.rows:
+            return
+        selected = self.selected_row()
+        anchor = self.rows[min(self.first, len(self.rows) - 1)]
+        # Stable sorts from the least significant key up give the multi-column order
+        for key, reverse in reversed(self.order):
+            self.rows.sort(key=key, reverse=reverse)
+        for index, row in enumerate(self.rows):
+            if row is anchor:
+                self.first = index
+            if row is selected:
+                self.selected = index
+
+    # ----- selection -----
+
+    def selected_row(self):
+        return None if self.selected is None else self.rows[self.selected]
+
+    def select(self, index):
+        """Select the row at index (None clears it), scroll it into view and notify on_select"""
+        if index is not None:
+            index = max(0, min(index, len(self.rows) - 1)) if self.rows else None
+        if index == self.selected:
+            return
+        self.selected = index
+        if index is not None:
+            self.see(index)
+        self.refresh()
+        if self.on_select:
+            self.on_select(self.selected_row())
+
+    def _on_tree_select(self, event):
+        selection = self.tree.selection()
+        if selection and selection[0] in self._items:
+            index = self.first + self._items.index(selection[0])
+        elif self.selected is not None and not self._in_view(self.selected):
+            # refresh() took the selection off a row that was scrolled out of view
+            return
+        else:
+            index = None
+        if index != self.selected:
+            self.select(index)
+
+    def _move_selection(self, delta):
+        if self.rows:
+            self.select(delta - 1 if self.selected is None and delta > 0 else (self.selected or 0) + delta)
+        return "break"
+
+    # ----- scrolling -----
+
+    def _in_view(self, index) -> bool:
+        return self.first <= index < self.first + self.visible
+
+    def see(self, index):
+        """Scroll so that the row at index is visible"""
+        if index < self.first:
+            self.first = index
+        elif index >= self.first + self.visible:
+            self.first = index - self.visible + 1
+
+    def scroll_to(self, first):
+        first = max(0, min(first, len(self.rows) - self.visible))
+        if first != self.first:
+            self.first = first
+            self.refresh()
+
+    def yview(self, *args):
+        """Scrollbar command: ('moveto', fraction) or ('scroll', count, 'units' | 'pages')"""
+        if args[0] == "moveto":
+            self.scroll_to(round(float(args[1]) * len(self.rows)))
+        elif args[0] == "scroll":
+            step = self.visible if args[2] == "pages" else 1
+            self.scroll_to(self.first + int(args[1]) * step)
+
+    def _scroll_lines(self, count):
+        self.scroll_to(self.first + count)
+        return "break"
+
+    def _on_wheel(self, event):
+        steps = -int(event.delta / 120) or (-1 if event.delta > 0 else 1)
+        return self._scroll_lines(steps * self.SCROLL_UNITS)
+
+    def _on_configure(self, event):
+        self._height = event.height
+        if self._fit():
+            self.refresh()
+
+    def _fit(self) -> bool:
+        """Size the window to the lines the tree has room for; True if that changed"""
+        if self._height is None or not self._items:
+            return False
+        box = self.tree.bbox(self._items[0])
+        if not box:
+            return False
+        visible = max(1, (self._height - box[1]) // box[3])
+        if visible == self.visible:
+            return False
+        self.visible = visible
+        return True
+
+    # ----- drawing -----
+
+    def refresh(self):
+        """Re-fill the visible items from self.rows; items whose values did not change are left alone"""
+        total = len(self.rows)
+        self.first = max(0, min(self.first, total - self.visible))
+        window = range(self.first, min(total, self.first + self.visible))
+        items = self._items
+        while len(items) < len(window):
+            items.append(self.tree.insert("", "end"))
+        while len(items) > len(window):
+            item = items.pop()
+            self._shown.pop(item, None)
+            self.tree.delete(item)
+
+        selected_item = ()
+        for item, index in zip(items, window):
+            row = self.rows[index]
+            tags = tuple(self.tags_for(row))
+            if index == self.selected:
+                selected_item = (item,)
+                if self.selected_tag:
+                    tags += (self.selected_tag,)
+            shown = (tuple(self.format_row(row)), tags)
+            if self._shown.get(item) != shown:
+                self.tree.item(item, values=shown[0], tags=tags)
+                self._shown[item] = shown
+        if self.tree.selection() != selected_item:
+            self.tree.selection_set(selected_item)
+
+        if total:
+            self.scrollbar.set(self.first / total, (self.first + len(window)) / total)
+        else:
+            self.scrollbar.set(0, 1)
+        if self.on_scroll_end and (not total or (self.first + len(window)) / total >= self.threshold):
+            self.tree.after_idle(self.on_scroll_end)
+        if self._fit():
+            self.refresh()